@@ -3,7 +3,7 @@ from __future__ import annotations
 from flask import Flask, jsonify
 
 from .config import BASE_INSTRUCTIONS, GPT5_CODEX_INSTRUCTIONS
-from .http import build_cors_headers
+from .http import apply_cors_headers
 from .routes_openai import openai_bp
 from .routes_ollama import ollama_bp
 from .routes_responses import responses_bp
@@ -57,9 +57,7 @@ def create_app(
 
     @app.after_request
     def _cors(resp):
-        for k, v in build_cors_headers().items():
-            resp.headers.setdefault(k, v)
-        return resp
+        return apply_cors_headers(resp)
 
     app.register_blueprint(openai_bp)
     app.register_blueprint(ollama_bp)
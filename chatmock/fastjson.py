@@ -0,0 +1,39 @@
+from __future__ import annotations
+
+import json
+from typing import Any
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def _json_loads(data: bytes | str) -> Any:
+    return json.loads(data)
+
+
+def _json_dumps(obj: Any) -> bytes:
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+# Bind the C functions directly when orjson is present so hot loops pay no wrapper call.
+# loads() parses JSON from bytes or str; dumps() returns compact UTF-8 JSON bytes.
+if orjson is not None:
+    loads = orjson.loads
+    dumps = orjson.dumps
+else:
+    loads = _json_loads
+    dumps = _json_dumps
+
+
+if orjson is not None:
+    _APPEND_NEWLINE = orjson.OPT_APPEND_NEWLINE
+
+    def dumps_line(obj: Any) -> bytes:
+        """dumps() plus a trailing newline, for JSONL/NDJSON; orjson writes it in the same buffer."""
+        return orjson.dumps(obj, option=_APPEND_NEWLINE)
+else:
+    def dumps_line(obj: Any) -> bytes:
+        """dumps() plus a trailing newline, for JSONL/NDJSON."""
+        return _json_dumps(obj) + b"\n"
@@ -1,24 +1,49 @@
 from __future__ import annotations
 
-from flask import Response, jsonify, request
+from typing import Any
+
+from flask import Response, request
+
+from .fastjson import dumps
+
+
+_CORS_ALLOW_METHODS = "POST, GET, OPTIONS"
+_CORS_DEFAULT_ALLOW_HEADERS = "Authorization, Content-Type, Accept"
+_CORS_MAX_AGE = "86400"
 
 
 def build_cors_headers() -> dict:
     origin = request.headers.get("Origin", "*")
     req_headers = request.headers.get("Access-Control-Request-Headers")
-    allow_headers = req_headers if req_headers else "Authorization, Content-Type, Accept"
+    allow_headers = req_headers if req_headers else _CORS_DEFAULT_ALLOW_HEADERS
     return {
         "Access-Control-Allow-Origin": origin,
-        "Access-Control-Allow-Methods": "POST, GET, OPTIONS",
+        "Access-Control-Allow-Methods": _CORS_ALLOW_METHODS,
         "Access-Control-Allow-Headers": allow_headers,
-        "Access-Control-Max-Age": "86400",
+        "Access-Control-Max-Age": _CORS_MAX_AGE,
     }
 
 
-def json_error(message: str, status: int = 400) -> Response:
-    resp = jsonify({"error": {"message": message}})
-    response: Response = Response(response=resp.response, status=status, mimetype="application/json")
-    for k, v in build_cors_headers().items():
-        response.headers.setdefault(k, v)
+def apply_cors_headers(response: Response) -> Response:
+    """Set CORS headers on ``response`` without building an intermediate dict.
+
+    Only the origin and requested headers vary per request; the rest are constants.
+    """
+    headers = response.headers
+    req_headers = request.headers
+    headers.setdefault("Access-Control-Allow-Origin", req_headers.get("Origin", "*"))
+    headers.setdefault("Access-Control-Allow-Methods", _CORS_ALLOW_METHODS)
+    headers.setdefault(
+        "Access-Control-Allow-Headers",
+        req_headers.get("Access-Control-Request-Headers") or _CORS_DEFAULT_ALLOW_HEADERS,
+    )
+    headers.setdefault("Access-Control-Max-Age", _CORS_MAX_AGE)
     return response
 
+
+def json_response(obj: Any, status: int = 200) -> Response:
+    return apply_cors_headers(Response(dumps(obj), status=status, mimetype="application/json"))
+
+
+def json_error(message: str, status: int = 400) -> Response:
+    return json_response({"error": {"message": message}}, status)
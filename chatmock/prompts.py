@@ -22,6 +22,11 @@ from typing import Dict, Optional, Tuple
 
 import requests
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 LOGGER = logging.getLogger(__name__)
 
 CODEX_BASE_PRIMARY = "https://raw.githubusercontent.com/openai/codex/main/codex-rs/core/prompt.md"
@@ -77,6 +82,8 @@ class PromptCache:
     def _load_metadata(self) -> Dict[str, object]:
         try:
             if self.metadata_file.exists():
+                if orjson is not None:
+                    return orjson.loads(self.metadata_file.read_bytes())
                 with self.metadata_file.open("r", encoding="utf-8") as fh:
                     return json.load(fh)
         except Exception:
@@ -85,6 +92,9 @@ class PromptCache:
 
     def _save_metadata(self) -> None:
         try:
+            if orjson is not None:
+                self.metadata_file.write_bytes(orjson.dumps(self._metadata, option=orjson.OPT_INDENT_2))
+                return
             with self.metadata_file.open("w", encoding="utf-8") as fh:
                 json.dump(self._metadata, fh, indent=2)
         except Exception:
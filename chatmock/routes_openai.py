@@ -1,155 +1,164 @@
 from __future__ import annotations
 
 import json
+import sys
 import time
+from functools import lru_cache
 from typing import Any, Dict, List
 
-from flask import Blueprint, Response, current_app, jsonify, make_response, request
+from flask import Blueprint, Response, request
 
-from .config import BASE_INSTRUCTIONS, GPT5_CODEX_INSTRUCTIONS
+from .config import BASE_INSTRUCTIONS
+from .fastjson import dumps, loads
 from .prompts import mark_prompt_invalid
 from .limits import record_rate_limits_from_response
-from .http import build_cors_headers
+from .http import apply_cors_headers, json_response
 from .reasoning import apply_reasoning_to_message, build_reasoning_param, extract_reasoning_from_model_name
+from .settings import get_settings, instructions_for_model
+from .sse_consume import CHAT_KINDS, TEXT_KINDS, consume_sse
+from .transform import hoist_system_message
 from .upstream import normalize_model_name, start_upstream_request
 from .utils import (
     convert_chat_messages_to_responses_input,
     convert_tools_chat_to_responses,
+    responses_tools_too_large,
     sse_translate_chat,
     sse_translate_text,
+    vlog,
 )
 
 
 openai_bp = Blueprint("openai", __name__)
 
 
-def _instructions_for_model(model: str) -> str:
-    base = current_app.config.get("BASE_INSTRUCTIONS", BASE_INSTRUCTIONS)
-    if model == "gpt-5-codex":
-        codex = current_app.config.get("GPT5_CODEX_INSTRUCTIONS") or GPT5_CODEX_INSTRUCTIONS
-        if isinstance(codex, str) and codex.strip():
-            return codex
-    return base
+_MODEL_GROUPS = (
+    ("gpt-5", ("high", "medium", "low", "minimal")),
+    ("gpt-5-codex", ("high", "medium", "low")),
+    ("codex-mini", ()),
+)
+
+
+@lru_cache(maxsize=2)
+def _models_body(expose_variants: bool) -> bytes:
+    model_ids: List[str] = []
+    for base, efforts in _MODEL_GROUPS:
+        model_ids.append(base)
+        if expose_variants:
+            model_ids.extend([f"{base}-{effort}" for effort in efforts])
+    data = [{"id": mid, "object": "model", "owned_by": "owner"} for mid in model_ids]
+    return dumps({"object": "list", "data": data})
 
 
 @openai_bp.route("/v1/chat/completions", methods=["POST"])
 def chat_completions() -> Response:
-    verbose = bool(current_app.config.get("VERBOSE"))
-    reasoning_effort = current_app.config.get("REASONING_EFFORT", "medium")
-    reasoning_summary = current_app.config.get("REASONING_SUMMARY", "auto")
-    reasoning_compat = current_app.config.get("REASONING_COMPAT", "think-tags")
-    debug_model = current_app.config.get("DEBUG_MODEL")
-
-    # Log request summary for debugging
-    try:
-        import sys
-        raw = request.get_data(cache=True, as_text=True) or ""
-        payload = json.loads(raw) if raw else {}
-        req_summary = {
-            "route": "/v1/chat/completions",
-            "model": payload.get("model"),
-            "stream": payload.get("stream"),
-            "has_tools": "tools" in payload,
-            "has_responses_tools": "responses_tools" in payload,
-            "user_agent": request.headers.get("User-Agent", "unknown")[:50],
-        }
-        print(f"[CHAT] Request: {json.dumps(req_summary)}", file=sys.stderr)
-    except Exception:
-        pass
+    settings = get_settings()
+    verbose = settings.verbose
+    reasoning_effort = settings.reasoning_effort
+    reasoning_summary = settings.reasoning_summary
+    reasoning_compat = settings.reasoning_compat
+    debug_model = settings.debug_model
+    raw = request.get_data(cache=True) or b""
 
     if verbose:
         try:
-            body_preview = (request.get_data(cache=True, as_text=True) or "")[:2000]
-            print("IN POST /v1/chat/completions\n" + body_preview)
+            body_preview = raw[:2000].decode("utf-8", errors="replace")
+            vlog("IN POST /v1/chat/completions\n" + body_preview)
         except Exception:
             pass
 
-    raw = request.get_data(cache=True, as_text=True) or ""
     try:
-        payload = json.loads(raw) if raw else {}
+        payload = loads(raw) if raw else {}
     except Exception:
         try:
-            payload = json.loads(raw.replace("\r", "").replace("\n", ""))
+            payload = loads(raw.replace(b"\r", b"").replace(b"\n", b""))
         except Exception:
-            return jsonify({"error": {"message": "Invalid JSON body"}}), 400
+            return json_response({"error": {"message": "Invalid JSON body"}}, 400)
+
+    if verbose:
+        try:
+            req_summary = {
+                "route": "/v1/chat/completions",
+                "model": payload.get("model"),
+                "stream": payload.get("stream"),
+                "has_tools": "tools" in payload,
+                "has_responses_tools": "responses_tools" in payload,
+                "user_agent": request.headers.get("User-Agent", "unknown")[:50],
+            }
+            vlog(f"[CHAT] Request: {json.dumps(req_summary)}", file=sys.stderr)
+        except Exception:
+            pass
 
     requested_model = payload.get("model")
     model = normalize_model_name(requested_model, debug_model)
     prompt_key = "gpt5_codex_instructions" if model == "gpt-5-codex" else "base_instructions"
-    instructions_text = _instructions_for_model(model)
+    instructions_text = instructions_for_model(model)
+    prompt = payload.get("prompt")
     messages = payload.get("messages")
-    if messages is None and isinstance(payload.get("prompt"), str):
-        messages = [{"role": "user", "content": payload.get("prompt") or ""}]
-    if messages is None and isinstance(payload.get("input"), str):
-        messages = [{"role": "user", "content": payload.get("input") or ""}]
+    if messages is None and isinstance(prompt, str):
+        messages = [{"role": "user", "content": prompt or ""}]
+    if messages is None:
+        input_text = payload.get("input")
+        if isinstance(input_text, str):
+            messages = [{"role": "user", "content": input_text or ""}]
     if messages is None:
         messages = []
     if not isinstance(messages, list):
-        return jsonify({"error": {"message": "Request must include messages: []"}}), 400
-
-    if isinstance(messages, list):
-        sys_idx = next((i for i, m in enumerate(messages) if isinstance(m, dict) and m.get("role") == "system"), None)
-        if isinstance(sys_idx, int):
-            sys_msg = messages.pop(sys_idx)
-            content = sys_msg.get("content") if isinstance(sys_msg, dict) else ""
-            messages.insert(0, {"role": "user", "content": content})
+        return json_response({"error": {"message": "Request must include messages: []"}}, 400)
+
+    messages = hoist_system_message(messages)
     is_stream = bool(payload.get("stream"))
-    stream_options = payload.get("stream_options") if isinstance(payload.get("stream_options"), dict) else {}
-    include_usage = bool(stream_options.get("include_usage", False))
+    stream_options = payload.get("stream_options")
+    include_usage = isinstance(stream_options, dict) and bool(stream_options.get("include_usage", False))
 
     tools_responses = convert_tools_chat_to_responses(payload.get("tools"))
     tool_choice = payload.get("tool_choice", "auto")
     parallel_tool_calls = bool(payload.get("parallel_tool_calls", False))
-    responses_tools_payload = payload.get("responses_tools") if isinstance(payload.get("responses_tools"), list) else []
+    responses_tool_choice = payload.get("responses_tool_choice")
+    responses_tools_payload = payload.get("responses_tools")
+    if not isinstance(responses_tools_payload, list):
+        responses_tools_payload = []
     extra_tools: List[Dict[str, Any]] = []
     had_responses_tools = False
-    if isinstance(responses_tools_payload, list):
-        for _t in responses_tools_payload:
-            if not (isinstance(_t, dict) and isinstance(_t.get("type"), str)):
-                continue
-            if _t.get("type") not in ("web_search", "web_search_preview"):
-                return (
-                    jsonify(
-                        {
-                            "error": {
-                                "message": "Only web_search/web_search_preview are supported in responses_tools",
-                                "code": "RESPONSES_TOOL_UNSUPPORTED",
-                            }
-                        }
-                    ),
-                    400,
-                )
-            extra_tools.append(_t)
-
-        if not extra_tools and bool(current_app.config.get("DEFAULT_WEB_SEARCH")):
-            responses_tool_choice = payload.get("responses_tool_choice")
-            if not (isinstance(responses_tool_choice, str) and responses_tool_choice == "none"):
-                extra_tools = [{"type": "web_search"}]
-
-        if extra_tools:
-            import json as _json
-            MAX_TOOLS_BYTES = 32768
-            try:
-                size = len(_json.dumps(extra_tools))
-            except Exception:
-                size = 0
-            if size > MAX_TOOLS_BYTES:
-                return jsonify({"error": {"message": "responses_tools too large", "code": "RESPONSES_TOOLS_TOO_LARGE"}}), 400
-            had_responses_tools = True
-            tools_responses = (tools_responses or []) + extra_tools
+    for _t in responses_tools_payload:
+        if not (isinstance(_t, dict) and isinstance(_t.get("type"), str)):
+            continue
+        if _t.get("type") not in ("web_search", "web_search_preview"):
+            return json_response(
+                {
+                    "error": {
+                        "message": "Only web_search/web_search_preview are supported in responses_tools",
+                        "code": "RESPONSES_TOOL_UNSUPPORTED",
+                    }
+                },
+                400,
+            )
+        extra_tools.append(_t)
+
+    if extra_tools:
+        # Only client-supplied tools need the size cap; the default below is a fixed one-item list
+        if responses_tools_too_large(extra_tools):
+            return json_response({"error": {"message": "responses_tools too large", "code": "RESPONSES_TOOLS_TOO_LARGE"}}, 400)
+    elif settings.default_web_search:
+        if not (isinstance(responses_tool_choice, str) and responses_tool_choice == "none"):
+            extra_tools = [{"type": "web_search"}]
+
+    if extra_tools:
+        had_responses_tools = True
+        tools_responses = (tools_responses or []) + extra_tools
 
-    responses_tool_choice = payload.get("responses_tool_choice")
     if isinstance(responses_tool_choice, str) and responses_tool_choice in ("auto", "none"):
         tool_choice = responses_tool_choice
 
     input_items = convert_chat_messages_to_responses_input(messages)
-    if not input_items and isinstance(payload.get("prompt"), str) and payload.get("prompt").strip():
+    if not input_items and isinstance(prompt, str) and prompt.strip():
         input_items = [
-            {"type": "message", "role": "user", "content": [{"type": "input_text", "text": payload.get("prompt")}]}
+            {"type": "message", "role": "user", "content": [{"type": "input_text", "text": prompt}]}
         ]
 
     model_reasoning = extract_reasoning_from_model_name(requested_model)
-    reasoning_overrides = payload.get("reasoning") if isinstance(payload.get("reasoning"), dict) else model_reasoning
+    reasoning_overrides = payload.get("reasoning")
+    if not isinstance(reasoning_overrides, dict):
+        reasoning_overrides = model_reasoning
     reasoning_param = build_reasoning_param(reasoning_effort, reasoning_summary, reasoning_overrides)
 
     upstream, error_resp = start_upstream_request(
@@ -170,7 +179,7 @@ def chat_completions() -> Response:
     if upstream.status_code >= 400:
         try:
             raw = upstream.content
-            err_body = json.loads(raw.decode("utf-8", errors="ignore")) if raw else {"raw": upstream.text}
+            err_body = loads(raw) if raw else {"raw": upstream.text}
         except Exception:
             err_body = {"raw": upstream.text}
         error_dict = err_body.get("error") if isinstance(err_body, dict) else None
@@ -194,8 +203,7 @@ def chat_completions() -> Response:
         if isinstance(err_body, dict) and isinstance(err_body.get("raw"), str):
             payload_error["raw"] = err_body.get("raw")
         try:
-            import sys
-            print(
+            vlog(
                 f"[UPSTREAM_ERROR] route=/v1/chat/completions status={upstream.status_code} message={message}",
                 file=sys.stderr,
             )
@@ -206,7 +214,7 @@ def chat_completions() -> Response:
             mark_prompt_invalid(prompt_key, instructions_text, failure_hint)
         if had_responses_tools:
             if verbose:
-                print("[Passthrough] Upstream rejected tools; retrying without extra tools (args redacted)")
+                vlog("[Passthrough] Upstream rejected tools; retrying without extra tools (args redacted)")
             base_tools_only = convert_tools_chat_to_responses(payload.get("tools"))
             safe_choice = payload.get("tool_choice", "auto")
             upstream2, err2 = start_upstream_request(
@@ -223,11 +231,11 @@ def chat_completions() -> Response:
                 upstream = upstream2
             else:
                 payload_error.setdefault("code", "RESPONSES_TOOLS_REJECTED")
-                return jsonify({"error": payload_error}), (upstream2.status_code if upstream2 is not None else upstream.status_code)
+                return json_response({"error": payload_error}, (upstream2.status_code if upstream2 is not None else upstream.status_code))
         else:
             if verbose:
-                print("Upstream error status=", upstream.status_code)
-            return jsonify({"error": payload_error}), upstream.status_code
+                vlog("Upstream error status=", upstream.status_code)
+            return json_response({"error": payload_error}, upstream.status_code)
 
     if is_stream:
         resp = Response(
@@ -236,96 +244,32 @@ def chat_completions() -> Response:
                 requested_model or model,
                 created,
                 verbose=verbose,
-                vlog=print if verbose else None,
+                vlog=vlog if verbose else None,
                 reasoning_compat=reasoning_compat,
                 include_usage=include_usage,
             ),
             status=upstream.status_code,
             mimetype="text/event-stream",
             headers={"Cache-Control": "no-cache", "Connection": "keep-alive"},
+            direct_passthrough=True,
         )
-        for k, v in build_cors_headers().items():
-            resp.headers.setdefault(k, v)
-        return resp
-
-    full_text = ""
-    reasoning_summary_text = ""
-    reasoning_full_text = ""
-    response_id = "chatcmpl"
-    tool_calls: List[Dict[str, Any]] = []
-    error_message: str | None = None
-    usage_obj: Dict[str, int] | None = None
-
-    def _extract_usage(evt: Dict[str, Any]) -> Dict[str, int] | None:
-        try:
-            usage = (evt.get("response") or {}).get("usage")
-            if not isinstance(usage, dict):
-                return None
-            pt = int(usage.get("input_tokens") or 0)
-            ct = int(usage.get("output_tokens") or 0)
-            tt = int(usage.get("total_tokens") or (pt + ct))
-            return {"prompt_tokens": pt, "completion_tokens": ct, "total_tokens": tt}
-        except Exception:
-            return None
-    try:
-        for raw in upstream.iter_lines(decode_unicode=False):
-            if not raw:
-                continue
-            line = raw.decode("utf-8", errors="ignore") if isinstance(raw, (bytes, bytearray)) else raw
-            if not line.startswith("data: "):
-                continue
-            data = line[len("data: "):].strip()
-            if not data:
-                continue
-            if data == "[DONE]":
-                break
-            try:
-                evt = json.loads(data)
-            except Exception:
-                continue
-            kind = evt.get("type")
-            mu = _extract_usage(evt)
-            if mu:
-                usage_obj = mu
-            if isinstance(evt.get("response"), dict) and isinstance(evt["response"].get("id"), str):
-                response_id = evt["response"].get("id") or response_id
-            if kind == "response.output_text.delta":
-                full_text += evt.get("delta") or ""
-            elif kind == "response.reasoning_summary_text.delta":
-                reasoning_summary_text += evt.get("delta") or ""
-            elif kind == "response.reasoning_text.delta":
-                reasoning_full_text += evt.get("delta") or ""
-            elif kind == "response.output_item.done":
-                item = evt.get("item") or {}
-                if isinstance(item, dict) and item.get("type") == "function_call":
-                    call_id = item.get("call_id") or item.get("id") or ""
-                    name = item.get("name") or ""
-                    args = item.get("arguments") or ""
-                    if isinstance(call_id, str) and isinstance(name, str) and isinstance(args, str):
-                        tool_calls.append(
-                            {
-                                "id": call_id,
-                                "type": "function",
-                                "function": {"name": name, "arguments": args},
-                            }
-                        )
-            elif kind == "response.failed":
-                error_message = evt.get("response", {}).get("error", {}).get("message", "response.failed")
-            elif kind == "response.completed":
-                break
-    finally:
-        upstream.close()
-
-    if error_message:
-        resp = make_response(jsonify({"error": {"message": error_message}}), 502)
-        for k, v in build_cors_headers().items():
-            resp.headers.setdefault(k, v)
-        return resp
+        return apply_cors_headers(resp)
+
+    result = consume_sse(upstream, CHAT_KINDS)
+    full_text = result.full_text
+    response_id = result.response_id or "chatcmpl"
+    usage_obj = result.usage
+
+    if result.error_message:
+        return json_response({"error": {"message": result.error_message}}, 502)
 
     message: Dict[str, Any] = {"role": "assistant", "content": full_text if full_text else None}
-    if tool_calls:
-        message["tool_calls"] = tool_calls
-    message = apply_reasoning_to_message(message, reasoning_summary_text, reasoning_full_text, reasoning_compat)
+    if result.tool_call_parts:
+        message["tool_calls"] = result.tool_calls
+    if result.saw_reasoning:
+        message = apply_reasoning_to_message(
+            message, result.reasoning_summary_text, result.reasoning_full_text, reasoning_compat
+        )
     completion = {
         "id": response_id or "chatcmpl",
         "object": "chat.completion",
@@ -338,48 +282,49 @@ def chat_completions() -> Response:
                 "finish_reason": "stop",
             }
         ],
-        **({"usage": usage_obj} if usage_obj else {}),
     }
-    resp = make_response(jsonify(completion), upstream.status_code)
-    for k, v in build_cors_headers().items():
-        resp.headers.setdefault(k, v)
-    return resp
+    if usage_obj:
+        completion["usage"] = usage_obj
+    return json_response(completion, upstream.status_code)
 
 
 @openai_bp.route("/v1/completions", methods=["POST"])
 def completions() -> Response:
-    verbose = bool(current_app.config.get("VERBOSE"))
-    debug_model = current_app.config.get("DEBUG_MODEL")
-    reasoning_effort = current_app.config.get("REASONING_EFFORT", "medium")
-    reasoning_summary = current_app.config.get("REASONING_SUMMARY", "auto")
+    settings = get_settings()
+    verbose = settings.verbose
+    debug_model = settings.debug_model
+    reasoning_effort = settings.reasoning_effort
+    reasoning_summary = settings.reasoning_summary
 
-    raw = request.get_data(cache=True, as_text=True) or ""
+    raw = request.get_data(cache=True) or b""
     try:
-        payload = json.loads(raw) if raw else {}
+        payload = loads(raw) if raw else {}
     except Exception:
-        return jsonify({"error": {"message": "Invalid JSON body"}}), 400
+        return json_response({"error": {"message": "Invalid JSON body"}}, 400)
 
     requested_model = payload.get("model")
     model = normalize_model_name(requested_model, debug_model)
     prompt = payload.get("prompt")
     if isinstance(prompt, list):
-        prompt = "".join([p if isinstance(p, str) else "" for p in prompt])
+        prompt = "".join(p for p in prompt if isinstance(p, str))
     if not isinstance(prompt, str):
         prompt = payload.get("suffix") or ""
     stream_req = bool(payload.get("stream", False))
-    stream_options = payload.get("stream_options") if isinstance(payload.get("stream_options"), dict) else {}
-    include_usage = bool(stream_options.get("include_usage", False))
+    stream_options = payload.get("stream_options")
+    include_usage = isinstance(stream_options, dict) and bool(stream_options.get("include_usage", False))
 
     messages = [{"role": "user", "content": prompt or ""}]
     input_items = convert_chat_messages_to_responses_input(messages)
 
     model_reasoning = extract_reasoning_from_model_name(requested_model)
-    reasoning_overrides = payload.get("reasoning") if isinstance(payload.get("reasoning"), dict) else model_reasoning
+    reasoning_overrides = payload.get("reasoning")
+    if not isinstance(reasoning_overrides, dict):
+        reasoning_overrides = model_reasoning
     reasoning_param = build_reasoning_param(reasoning_effort, reasoning_summary, reasoning_overrides)
     upstream, error_resp = start_upstream_request(
         model,
         input_items,
-        instructions=_instructions_for_model(model),
+        instructions=instructions_for_model(model),
         reasoning_param=reasoning_param,
     )
     if error_resp is not None:
@@ -389,30 +334,26 @@ def completions() -> Response:
 
     created = int(time.time())
     if upstream.status_code >= 400:
+        err_raw = upstream.content or b""
         try:
-            err_body = json.loads(upstream.content.decode("utf-8", errors="ignore")) if upstream.content else {"raw": upstream.text}
+            err_body = loads(err_raw) if err_raw else {}
         except Exception:
-            err_body = {"raw": upstream.text}
-        
+            err_body = {}
+        error_obj = err_body.get("error") if isinstance(err_body, dict) else None
+        message = (error_obj.get("message") if isinstance(error_obj, dict) else None) or "Upstream error"
+
         # Log the upstream error with details - write to stderr so it appears in logs
         try:
-            import logging
-            logging.basicConfig()
-            logger = logging.getLogger(__name__)
             error_msg = {
                 "status": upstream.status_code,
-                "error": err_body,
+                "error": err_raw[:2000].decode("utf-8", errors="replace"),
                 "model": model,
                 "user_agent": request.headers.get("User-Agent", "unknown")[:50],
             }
-            # Use print to stderr to ensure it gets to error log
-            print(f"[UPSTREAM_ERROR] {json.dumps(error_msg)}", file=sys.stderr, flush=True)
+            vlog(f"[UPSTREAM_ERROR] {json.dumps(error_msg)}", file=sys.stderr)
         except Exception:
             pass
-        return (
-            jsonify({"error": {"message": (err_body.get("error", {}) or {}).get("message", "Upstream error")}}),
-            upstream.status_code,
-        )
+        return json_response({"error": {"message": message}}, upstream.status_code)
 
     if stream_req:
         resp = Response(
@@ -421,59 +362,20 @@ def completions() -> Response:
                 requested_model or model,
                 created,
                 verbose=verbose,
-                vlog=(print if verbose else None),
+                vlog=(vlog if verbose else None),
                 include_usage=include_usage,
             ),
             status=upstream.status_code,
             mimetype="text/event-stream",
             headers={"Cache-Control": "no-cache", "Connection": "keep-alive"},
+            direct_passthrough=True,
         )
-        for k, v in build_cors_headers().items():
-            resp.headers.setdefault(k, v)
-        return resp
-
-    full_text = ""
-    response_id = "cmpl"
-    usage_obj: Dict[str, int] | None = None
-    def _extract_usage(evt: Dict[str, Any]) -> Dict[str, int] | None:
-        try:
-            usage = (evt.get("response") or {}).get("usage")
-            if not isinstance(usage, dict):
-                return None
-            pt = int(usage.get("input_tokens") or 0)
-            ct = int(usage.get("output_tokens") or 0)
-            tt = int(usage.get("total_tokens") or (pt + ct))
-            return {"prompt_tokens": pt, "completion_tokens": ct, "total_tokens": tt}
-        except Exception:
-            return None
-    try:
-        for raw_line in upstream.iter_lines(decode_unicode=False):
-            if not raw_line:
-                continue
-            line = raw_line.decode("utf-8", errors="ignore") if isinstance(raw_line, (bytes, bytearray)) else raw_line
-            if not line.startswith("data: "):
-                continue
-            data = line[len("data: "):].strip()
-            if not data or data == "[DONE]":
-                if data == "[DONE]":
-                    break
-                continue
-            try:
-                evt = json.loads(data)
-            except Exception:
-                continue
-            if isinstance(evt.get("response"), dict) and isinstance(evt["response"].get("id"), str):
-                response_id = evt["response"].get("id") or response_id
-            mu = _extract_usage(evt)
-            if mu:
-                usage_obj = mu
-            kind = evt.get("type")
-            if kind == "response.output_text.delta":
-                full_text += evt.get("delta") or ""
-            elif kind == "response.completed":
-                break
-    finally:
-        upstream.close()
+        return apply_cors_headers(resp)
+
+    result = consume_sse(upstream, TEXT_KINDS)
+    full_text = result.full_text
+    response_id = result.response_id or "cmpl"
+    usage_obj = result.usage
 
     completion = {
         "id": response_id or "cmpl",
@@ -483,31 +385,15 @@ def completions() -> Response:
         "choices": [
             {"index": 0, "text": full_text, "finish_reason": "stop", "logprobs": None}
         ],
-        **({"usage": usage_obj} if usage_obj else {}),
     }
-    resp = make_response(jsonify(completion), upstream.status_code)
-    for k, v in build_cors_headers().items():
-        resp.headers.setdefault(k, v)
-    return resp
+    if usage_obj:
+        completion["usage"] = usage_obj
+    return json_response(completion, upstream.status_code)
 
 
 @openai_bp.route("/v1/models", methods=["GET"])
 def list_models() -> Response:
-    expose_variants = bool(current_app.config.get("EXPOSE_REASONING_MODELS"))
-    model_groups = [
-        ("gpt-5", ["high", "medium", "low", "minimal"]),
-        ("gpt-5-codex", ["high", "medium", "low"]),
-        ("codex-mini", []),
-    ]
-    model_ids: List[str] = []
-    for base, efforts in model_groups:
-        model_ids.append(base)
-        if expose_variants:
-            model_ids.extend([f"{base}-{effort}" for effort in efforts])
-    data = [{"id": mid, "object": "model", "owned_by": "owner"} for mid in model_ids]
-    models = {"object": "list", "data": data}
-    resp = make_response(jsonify(models), 200)
-    for k, v in build_cors_headers().items():
-        resp.headers.setdefault(k, v)
-    return resp
+    expose_variants = get_settings().expose_reasoning_models
+    resp = Response(_models_body(expose_variants), status=200, mimetype="application/json")
+    return apply_cors_headers(resp)
 
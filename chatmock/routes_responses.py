@@ -1,116 +1,166 @@
 from __future__ import annotations
 
+import atexit
 import json
+import queue
+import sys
 import time
-from typing import Any, Dict, List, Optional
+from typing import Any, Deque, Dict, Iterable, List, Optional
 import threading
-from collections import OrderedDict
+from collections import OrderedDict, deque
 from pathlib import Path
-from datetime import datetime
 
-from flask import Blueprint, Response, current_app, jsonify, make_response, request, stream_with_context
+from flask import Blueprint, Response, current_app, request, stream_with_context
 from requests.exceptions import ChunkedEncodingError, ConnectionError, ReadTimeout
 try:
     from urllib3.exceptions import ProtocolError
 except Exception:
     ProtocolError = Exception
 
-from .config import BASE_INSTRUCTIONS, GPT5_CODEX_INSTRUCTIONS
+from .fastjson import dumps, dumps_line, loads
 from .prompts import mark_prompt_invalid
-from .http import build_cors_headers
+from .http import apply_cors_headers, json_response
 from .limits import record_rate_limits_from_response
 from .reasoning import build_reasoning_param, extract_reasoning_from_model_name
+from .settings import get_settings, instructions_for_model
+from .sse_consume import RESPONSES_KINDS, consume_sse
 from .upstream import normalize_model_name, start_upstream_request
-from .utils import convert_chat_messages_to_responses_input, convert_tools_chat_to_responses
+from .utils import (
+    convert_chat_messages_to_responses_input,
+    convert_tools_chat_to_responses,
+    iter_upstream_chunks,
+    responses_tools_too_large,
+    vlog,
+)
 
 
 responses_bp = Blueprint("responses", __name__)
 
+class _BoundedStore:
+    """Insertion-ordered map that evicts its oldest entries once over capacity.
+
+    Writers serialize on a lock; reads are a single C-level dict lookup and take no lock.
+    """
+
+    def __init__(self, max_items: int) -> None:
+        self.max_items = max_items
+        self._lock = threading.Lock()
+        self._data: OrderedDict[str, Any] = OrderedDict()
+
+    def put(self, key: str, value: Any, max_items: int | None = None) -> None:
+        limit = self.max_items if max_items is None else max_items
+        data = self._data
+        with self._lock:
+            data[key] = value
+            # Re-storing an id refreshes its place in the eviction order
+            data.move_to_end(key)
+            while len(data) > limit:
+                data.popitem(last=False)
+
+    def get(self, key: str) -> Any:
+        return self._data.get(key)
+
+
 # Simple in-memory store for Responses objects (FIFO, size-limited)
-_STORE_LOCK = threading.Lock()
-_STORE: OrderedDict[str, Dict[str, Any]] = OrderedDict()
+_STORE = _BoundedStore(200)
 
 # Simple in-memory threads map: response_id -> list of input items representing the
-# conversation so far to prepend for previous_response_id simulation (non-stream focus)
-_THREADS_LOCK = threading.Lock()
-_THREADS: Dict[str, List[Dict[str, Any]]] = {}
+# conversation so far to prepend for previous_response_id simulation (non-stream focus).
+# Bounded as well, since every non-stream response records a thread.
+_THREADS = _BoundedStore(1000)
 
 
-def _store_response(obj: Dict[str, Any], *, max_items: int = 200) -> None:
+def _store_response(rid: str, body: bytes, *, max_items: int = 200) -> None:
+    """Keep a Responses object as its encoded JSON body.
+
+    Stored bytes are far smaller than the nested dicts they came from, and GET
+    /v1/responses/<id> can return them without encoding again.
+    """
     try:
-        rid = obj.get("id")
         if not isinstance(rid, str) or not rid:
             return
-        with _STORE_LOCK:
-            # Move to end if exists, else insert
-            if rid in _STORE:
-                _STORE.pop(rid, None)
-            _STORE[rid] = obj
-            # Trim to max_items
-            while len(_STORE) > max_items:
-                _STORE.popitem(last=False)
+        _STORE.put(rid, body, max_items)
     except Exception:
         pass
 
 
-def _get_response(rid: str) -> Dict[str, Any] | None:
-    with _STORE_LOCK:
-        return _STORE.get(rid)
+def _get_response(rid: str) -> bytes | None:
+    return _STORE.get(rid)
+
+
+# Clamp thread length to prevent runaway growth
+_THREAD_MAX_ITEMS = 40
 
 
-def _set_thread(rid: str, items: List[Dict[str, Any]]) -> None:
+def _new_thread(items: Iterable[Dict[str, Any]] = ()) -> Deque[Dict[str, Any]]:
+    """A thread buffer that keeps only the newest _THREAD_MAX_ITEMS items as it is filled."""
+    return deque(items, maxlen=_THREAD_MAX_ITEMS)
+
+
+def _set_thread(rid: str, items: Deque[Dict[str, Any]]) -> None:
     try:
-        if not (isinstance(rid, str) and rid and isinstance(items, list)):
+        if not (isinstance(rid, str) and rid and isinstance(items, deque)):
             return
-        # Clamp thread length to prevent runaway growth
-        MAX_ITEMS = 40
-        trimmed = items[-MAX_ITEMS:]
-        with _THREADS_LOCK:
-            _THREADS[rid] = trimmed
+        _THREADS.put(rid, items)
     except Exception:
         pass
 
 
-def _get_thread(rid: str) -> List[Dict[str, Any]] | None:
-    with _THREADS_LOCK:
-        return _THREADS.get(rid)
+def _get_thread(rid: str) -> Deque[Dict[str, Any]] | None:
+    return _THREADS.get(rid)
+
 
+_RS_REF_KEYS = frozenset({"previous_response_id", "response_id", "reference_id", "item_id"})
 
-def _collect_ids_with_rs_prefix(obj: Any, parent_key: str | None = None, out: List[str] | None = None) -> List[str]:
+
+def _iter_ids_with_rs_prefix(obj: Any):
+    # Explicit stack instead of recursion: deep tool payloads cannot hit the recursion
+    # limit, and each node is dispatched on its exact type. Children are pushed in
+    # reverse so ids come out in document order.
+    stack: List[tuple] = [(obj, None)]
+    pop = stack.pop
+    push = stack.append
+    while stack:
+        node, key = pop()
+        t = type(node)
+        if t is dict:
+            for k, v in reversed(list(node.items())):
+                push((v, k))
+        elif t is list:
+            for v in reversed(node):
+                push((v, key))
+        elif t is str:
+            if isinstance(key, str) and key.lower() in _RS_REF_KEYS:
+                value = node.strip()
+                if value.startswith("rs_"):
+                    yield value
+
+
+def _collect_ids_with_rs_prefix(obj: Any) -> List[str]:
     """Collect strings that look like upstream response ids (rs_*) only in structural fields.
 
     We deliberately ignore plain text under common text fields like 'content'/'text'.
     """
-    if out is None:
-        out = []
     try:
-        if isinstance(obj, str):
-            key = (parent_key or "").lower()
-            structural_keys = {
-                "previous_response_id",
-                "response_id",
-                "reference_id",
-                "item_id",
-            }
-            if key in structural_keys and obj.strip().startswith("rs_"):
-                out.append(obj.strip())
-        elif isinstance(obj, dict):
-            for k, v in obj.items():
-                _collect_ids_with_rs_prefix(v, k, out)
-        elif isinstance(obj, list):
-            for v in obj:
-                _collect_ids_with_rs_prefix(v, parent_key, out)
+        return list(_iter_ids_with_rs_prefix(obj))
     except Exception:
-        pass
-    return out
+        return []
+
+
+def _has_rs_ref(obj: Any) -> bool:
+    try:
+        return next(_iter_ids_with_rs_prefix(obj), None) is not None
+    except Exception:
+        return False
 
 
 def _sanitize_input_remove_upstream_refs(items: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
     def drop_ref_fields(d: Dict[str, Any]) -> Dict[str, Any]:
         try:
-            for key in ("previous_response_id", "response_id", "reference_id", "item_id"):
-                if isinstance(d.get(key), str) and d.get(key, "").startswith("rs_"):
-                    d.pop(key, None)
+            for key in _RS_REF_KEYS:
+                v = d.get(key)
+                if isinstance(v, str) and v.startswith("rs_"):
+                    del d[key]
         except Exception:
             pass
         return d
@@ -129,55 +179,188 @@ def _sanitize_input_remove_upstream_refs(items: List[Dict[str, Any]]) -> List[Di
                     new_parts.append(p)
                     continue
                 # If a part carries an rs_* id in a structural field, strip those fields but keep the part
-                if _collect_ids_with_rs_prefix(p):
-                    p = {kk: vv for kk, vv in p.items() if kk not in ("previous_response_id", "response_id", "reference_id", "item_id")}
+                if _has_rs_ref(p):
+                    p = {kk: vv for kk, vv in p.items() if kk not in _RS_REF_KEYS}
                 new_parts.append(p)
             it2["content"] = new_parts
         out.append(it2)
     return out
 
 
+def _message_part_to_input_text(part: Dict[str, Any]) -> Dict[str, Any]:
+    """Flatten a legacy 'message' content part into an input_text part."""
+    part_copy = dict(part)
+    part_copy["type"] = "input_text"
+    part_copy.pop("role", None)
+    raw_content = part_copy.pop("content", None)
+    text_fragments: list[str] = []
+    if isinstance(raw_content, list):
+        for segment in raw_content:
+            if isinstance(segment, dict):
+                text_val = segment.get("text")
+                if isinstance(text_val, str) and text_val.strip():
+                    text_fragments.append(text_val)
+                else:
+                    alt = segment.get("content")
+                    if isinstance(alt, str) and alt.strip():
+                        text_fragments.append(alt)
+            elif isinstance(segment, str) and segment.strip():
+                text_fragments.append(segment)
+    elif isinstance(raw_content, str):
+        if raw_content.strip():
+            text_fragments.append(raw_content)
+    elif raw_content is not None:
+        try:
+            text_fragments.append(json.dumps(raw_content, ensure_ascii=False))
+        except Exception:
+            pass
+    part_copy["text"] = "\n".join(fragment for fragment in text_fragments if fragment)
+    return part_copy
+
+
+_LOG_PATH = Path(__file__).resolve().parent.parent / "responses_debug.jsonl"
+_LOG_QUEUE: "queue.Queue[bytes]" = queue.Queue(maxsize=4096)
+_LOG_BATCH = 256
+_LOG_THREAD: threading.Thread | None = None
+_LOG_THREAD_LOCK = threading.Lock()
+
+
+def _drain_log_queue(block: bool = True) -> None:
+    while True:
+        try:
+            lines = [_LOG_QUEUE.get(block=block)]
+        except queue.Empty:
+            return
+        while len(lines) < _LOG_BATCH:
+            try:
+                lines.append(_LOG_QUEUE.get_nowait())
+            except queue.Empty:
+                break
+        try:
+            with _LOG_PATH.open("ab") as fp:
+                fp.write(b"".join(lines))
+        except Exception:
+            pass
+
+
+def _ensure_log_thread() -> None:
+    global _LOG_THREAD
+    if _LOG_THREAD is not None and _LOG_THREAD.is_alive():
+        return
+    with _LOG_THREAD_LOCK:
+        if _LOG_THREAD is not None and _LOG_THREAD.is_alive():
+            return
+        _LOG_THREAD = threading.Thread(target=_drain_log_queue, name="chatmock-responses-log", daemon=True)
+        _LOG_THREAD.start()
+
+
+atexit.register(_drain_log_queue, False)
+
+
+def _scrub_log_value(v: Any) -> Any:
+    """Clip long strings to a preview; containers are only copied when something inside changes."""
+    if isinstance(v, str):
+        return v[:256] + "…" if len(v) > 256 else v
+    if isinstance(v, dict):
+        out = None
+        for k, item in v.items():
+            clipped = _scrub_log_value(item)
+            if clipped is not item and out is None:
+                out = dict(v)
+            if out is not None:
+                out[k] = clipped
+        return v if out is None else out
+    if isinstance(v, list):
+        clipped_items = [_scrub_log_value(x) for x in v]
+        if all(a is b for a, b in zip(clipped_items, v)):
+            return v
+        return clipped_items
+    return v
+
+
+_TS_CACHE: tuple = (-1, "")
+
+
+def _log_timestamp() -> str:
+    # Same text as datetime.utcnow().strftime("%Y-%m-%dT%H:%M:%S.%fZ"); the seconds
+    # prefix is formatted once per second and only the microseconds per call. The
+    # cache is swapped as one tuple so concurrent callers never see a torn pair.
+    global _TS_CACHE
+    sec, usec = divmod(time.time_ns() // 1000, 1_000_000)
+    cached_sec, prefix = _TS_CACHE
+    if cached_sec != sec:
+        prefix = time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(sec))
+        _TS_CACHE = (sec, prefix)
+    return f"{prefix}.{usec:06d}Z"
+
+
+# Pass-through of additional Responses API fields.
+# Note: we intentionally DO NOT forward "store" upstream.
+# The ChatGPT codex/responses upstream rejects it (400 "Store must be set to false").
+# We still honor client "store" locally for non-stream aggregation and GET retrieval.
+# Tokens params are not forwarded to ChatGPT codex/responses either; it rejects both.
+_PASSTHROUGH_KEYS = (
+    "temperature",
+    "top_p",
+    "seed",
+    "stop",
+    "text",
+    "metadata",
+    "include",
+    "top_logprobs",
+    "truncation",
+)
+
+
+def _log_enabled() -> bool:
+    return get_settings().verbose or bool(current_app.config.get("CHATMOCK_RESPONSES_LOG"))
+
+
 def _log_event(event: str, **fields: Any) -> None:
     """Append a structured JSONL log entry.
 
     Fields are best-effort JSON-serialized. Large strings may be included; set
-    CHATMOCK_RESPONSES_LOG_BODY=false in config to suppress raw bodies.
+    CHATMOCK_RESPONSES_LOG_BODY=false in config to suppress raw bodies. The entry is
+    encoded here and written by a background thread in batches; entries are dropped
+    if the writer falls more than 4096 behind.
     """
     try:
-        log_enabled = bool(current_app.config.get("VERBOSE")) or bool(current_app.config.get("CHATMOCK_RESPONSES_LOG"))
-        if not log_enabled:
+        if not _log_enabled():
             return
-        repo_root = Path(__file__).resolve().parent.parent
-        log_path = repo_root / "responses_debug.jsonl"
-        ts = datetime.utcnow().strftime("%Y-%m-%dT%H:%M:%S.%fZ")
+        ts = _log_timestamp()
         entry: Dict[str, Any] = {"ts": ts, "event": event}
         # Optionally redact large bodies if disabled
         allow_body = str(current_app.config.get("CHATMOCK_RESPONSES_LOG_BODY") or "1").strip().lower() not in ("0", "false", "no", "off")
-        def _scrub(v: Any) -> Any:
-            if allow_body:
-                return v
-            if isinstance(v, dict):
-                return {k: _scrub(v.get(k)) for k in v.keys()}
-            if isinstance(v, list):
-                return [_scrub(x) for x in v]
-            if isinstance(v, str) and len(v) > 256:
-                return v[:256] + "…"  # preview only
-            return v
-        for k, v in fields.items():
-            entry[k] = _scrub(v)
-        with log_path.open("a", encoding="utf-8") as fp:
-            fp.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        if allow_body:
+            entry.update(fields)
+        else:
+            for k, v in fields.items():
+                entry[k] = _scrub_log_value(v)
+        line = dumps_line(entry)
+        _ensure_log_thread()
+        _LOG_QUEUE.put_nowait(line)
     except Exception:
         pass
 
 
-def _instructions_for_model(model: str) -> str:
-    base = current_app.config.get("BASE_INSTRUCTIONS", BASE_INSTRUCTIONS)
-    if model == "gpt-5-codex":
-        codex = current_app.config.get("GPT5_CODEX_INSTRUCTIONS") or GPT5_CODEX_INSTRUCTIONS
-        if isinstance(codex, str) and codex.strip():
-            return codex
-    return base
+def _request_summary(payload: Dict[str, Any]) -> Dict[str, Any]:
+    summary = {
+        "model": payload.get("model"),
+        "stream": payload.get("stream"),
+        "has_input": "input" in payload,
+        "has_messages": "messages" in payload,
+        "user_agent": request.headers.get("User-Agent", "unknown"),
+    }
+    inp = payload.get("input")
+    if isinstance(inp, list) and inp:
+        first_item = inp[0]
+        if isinstance(first_item, dict):
+            content = first_item.get("content")
+            if isinstance(content, list) and content:
+                first_part = content[0]
+                if isinstance(first_part, dict):
+                    summary["input_type"] = first_part.get("type", "unknown")
+    return summary
 
 
 @responses_bp.route("/v1/responses", methods=["POST"])
@@ -190,55 +373,41 @@ def responses_stream() -> Response:
     - Supports function tools plus optional web_search passthrough via responses_tools.
     """
 
-    verbose = bool(current_app.config.get("VERBOSE"))
-    reasoning_effort = current_app.config.get("REASONING_EFFORT", "medium")
-    reasoning_summary = current_app.config.get("REASONING_SUMMARY", "auto")
-    debug_model = current_app.config.get("DEBUG_MODEL")
+    settings = get_settings()
+    verbose = settings.verbose
+    reasoning_effort = settings.reasoning_effort
+    reasoning_summary = settings.reasoning_summary
+    debug_model = settings.debug_model
 
-    raw = request.get_data(cache=True, as_text=True) or ""
-    try:
-        # Console preview (truncated) plus structured log
-        if verbose:
-            print("IN POST /v1/responses\n" + (raw[:2000] if isinstance(raw, str) else ""))
-        if isinstance(raw, str):
-            _log_event(
-                "request_received",
-                route="/v1/responses",
-                bytes=len(raw.encode("utf-8")),
-                body=raw,
-                headers={k: v for k, v in request.headers.items() if k.lower() in ("content-type", "x-session-id", "user-agent")},
-            )
-    except Exception:
-        pass
+    raw = request.get_data(cache=True) or b""
+    if verbose:
+        # Console preview (truncated)
+        vlog("IN POST /v1/responses\n" + raw[:2000].decode("utf-8", errors="replace"))
     try:
-        payload = json.loads(raw) if raw else {}
+        payload = loads(raw) if raw else {}
     except Exception:
-        return jsonify({"error": {"message": "Invalid JSON body"}}), 400
-    
-    # Log request summary for debugging
-    try:
-        import sys
-        req_summary = {
-            "model": payload.get("model"),
-            "stream": payload.get("stream"),
-            "has_input": "input" in payload,
-            "has_messages": "messages" in payload,
-            "user_agent": request.headers.get("User-Agent", "unknown"),
-        }
-        if "input" in payload:
-            inp = payload["input"]
-            if isinstance(inp, list) and inp:
-                first_item = inp[0] if inp else {}
-                if isinstance(first_item, dict):
-                    content = first_item.get("content", [])
-                    if isinstance(content, list) and content:
-                        first_part = content[0] if content else {}
-                        if isinstance(first_part, dict):
-                            req_summary["input_type"] = first_part.get("type", "unknown")
-        
-        print(f"[RESPONSES] Request: {json.dumps(req_summary)}", file=sys.stderr)
-    except Exception:
-        pass
+        payload = None
+
+    # One structured entry (and, when verbose, one summary line) per request
+    log_enabled = _log_enabled()
+    if verbose or log_enabled:
+        try:
+            req_summary = _request_summary(payload) if isinstance(payload, dict) else None
+            if log_enabled:
+                _log_event(
+                    "request_received",
+                    route="/v1/responses",
+                    bytes=len(raw),
+                    body=raw.decode("utf-8", errors="replace"),
+                    headers={k: v for k, v in request.headers.items() if k.lower() in ("content-type", "x-session-id", "user-agent")},
+                    summary=req_summary,
+                )
+            if verbose and req_summary is not None:
+                vlog(f"[RESPONSES] Request: {dumps(req_summary).decode('utf-8')}", file=sys.stderr)
+        except Exception:
+            pass
+    if payload is None:
+        return json_response({"error": {"message": "Invalid JSON body"}}, 400)
 
     stream_req = payload.get("stream")
     if stream_req is None:
@@ -277,78 +446,56 @@ def responses_stream() -> Response:
     # Convert input_items to ensure compatibility with upstream API
     # Some clients send "message" type which needs to be converted to proper format
     if isinstance(input_items, list):
+        # Only a body that mentions "message" can hold parts needing conversion
+        may_have_message_parts = b'"message"' in raw
         converted_items = []
         had_conversions = False
-        
+
         for item in input_items:
             if not isinstance(item, dict):
                 continue
-            
-            converted_item = dict(item)
-            content = converted_item.get("content")
-            
-            # Convert content if needed
+
+            content = item.get("content")
             if isinstance(content, list):
-                new_content = []
-                for part in content:
-                    if not isinstance(part, dict):
-                        new_content.append(part)
-                        continue
-                    
-                    part_copy = dict(part)
-                    part_type = part_copy.get("type")
-                    
-                    # Convert "message" type to "input_text" for compatibility
-                    if part_type == "message":
-                        import sys
-                        print(f"[COMPATIBILITY] Converting 'message' type to 'input_text' for client: {request.headers.get('User-Agent', 'unknown')}", file=sys.stderr)
-                        had_conversions = True
-                        part_copy["type"] = "input_text"
-                        part_copy.pop("role", None)
-                        raw_content = part_copy.pop("content", None)
-                        text_fragments: list[str] = []
-                        if isinstance(raw_content, list):
-                            for segment in raw_content:
-                                if isinstance(segment, dict):
-                                    text_val = segment.get("text")
-                                    if isinstance(text_val, str) and text_val.strip():
-                                        text_fragments.append(text_val)
-                                    else:
-                                        alt = segment.get("content")
-                                        if isinstance(alt, str) and alt.strip():
-                                            text_fragments.append(alt)
-                                elif isinstance(segment, str) and segment.strip():
-                                    text_fragments.append(segment)
-                        elif isinstance(raw_content, str):
-                            if raw_content.strip():
-                                text_fragments.append(raw_content)
-                        elif raw_content is not None:
-                            try:
-                                import json as _json
-                                text_fragments.append(_json.dumps(raw_content, ensure_ascii=False))
-                            except Exception:
-                                pass
-                        part_copy["text"] = "\n".join(fragment for fragment in text_fragments if fragment)
-                        if not part_copy["text"]:
-                            part_copy["text"] = ""
-                    
-                    new_content.append(part_copy)
-                
-                converted_item["content"] = [p for p in new_content if not (isinstance(p, dict) and p.get("type") == "input_text" and not p.get("text"))]
-            
-            converted_items.append(converted_item)
-        
+                # Copied lazily: most items need no change and are passed through as-is
+                new_content = None
+                for idx, part in enumerate(content):
+                    new_part = part
+                    drop = False
+                    if isinstance(part, dict):
+                        # Convert "message" type to "input_text" for compatibility
+                        if may_have_message_parts and part.get("type") == "message":
+                            vlog(f"[COMPATIBILITY] Converting 'message' type to 'input_text' for client: {request.headers.get('User-Agent', 'unknown')}", file=sys.stderr)
+                            had_conversions = True
+                            new_part = _message_part_to_input_text(part)
+                        drop = new_part.get("type") == "input_text" and not new_part.get("text")
+                    if new_content is None:
+                        if new_part is part and not drop:
+                            continue
+                        new_content = content[:idx]
+                    if not drop:
+                        new_content.append(new_part)
+                if new_content is not None:
+                    item = dict(item)
+                    item["content"] = new_content
+
+            converted_items.append(item)
+
         if had_conversions:
             try:
                 _log_event("compatibility_conversion", from_type="message", to_type="input_text", user_agent=request.headers.get("User-Agent"))
             except Exception:
                 pass
-        
+
         input_items = converted_items
-    
+
+    # Upstream ids can only come from the client, so a body without "rs_" anywhere
+    # needs none of the reference scans or sanitizing passes below
+    may_have_rs_refs = b"rs_" in raw
+
     # Sanitize input to remove upstream 'rs_*' references in structural fields
     try:
-        rs_ids = _collect_ids_with_rs_prefix(raw_input)
+        rs_ids = _collect_ids_with_rs_prefix(raw_input) if may_have_rs_refs else []
         if rs_ids:
             try:
                 _log_event("client_input_refs_sanitized", count=len(rs_ids))
@@ -364,41 +511,43 @@ def responses_stream() -> Response:
 
     if input_items is None:
         messages = payload.get("messages")
-        if messages is None and isinstance(payload.get("prompt"), str):
-            messages = [{"role": "user", "content": payload.get("prompt") or ""}]
+        prompt = payload.get("prompt") if messages is None else None
+        if isinstance(prompt, str):
+            messages = [{"role": "user", "content": prompt}]
         if isinstance(messages, list):
             input_items = convert_chat_messages_to_responses_input(messages)
     if not isinstance(input_items, list) or not input_items:
-        return jsonify({"error": {"message": "Request must include non-empty 'input' (or 'messages'/'prompt')"}}), 400
+        return json_response({"error": {"message": "Request must include non-empty 'input' (or 'messages'/'prompt')"}}, 400)
 
-    # Final safety: sanitize constructed input_items to remove any upstream rs_* references
-    try:
-        before_n = len(input_items)
-        input_items = _sanitize_input_remove_upstream_refs(input_items)
-        after_n = len(input_items)
-        if after_n < before_n:
-            try:
-                _log_event("input_items_sanitized", removed=(before_n - after_n))
-            except Exception:
-                pass
-    except Exception:
-        pass
+    if may_have_rs_refs:
+        # Final safety: sanitize constructed input_items to remove any upstream rs_* references
+        try:
+            before_n = len(input_items)
+            input_items = _sanitize_input_remove_upstream_refs(input_items)
+            after_n = len(input_items)
+            if after_n < before_n:
+                try:
+                    _log_event("input_items_sanitized", removed=(before_n - after_n))
+                except Exception:
+                    pass
+        except Exception:
+            pass
 
-    # Log if any residual structural rs_* refs remain (should be zero)
-    try:
-        residual = _collect_ids_with_rs_prefix(input_items)
-        if residual:
-            _log_event("pre_upstream_refs_count", count=len(residual))
-    except Exception:
-        pass
+        # Log if any residual structural rs_* refs remain (should be zero)
+        try:
+            residual = _collect_ids_with_rs_prefix(input_items)
+            if residual:
+                _log_event("pre_upstream_refs_count", count=len(residual))
+        except Exception:
+            pass
 
     # previous_response_id threading (simulate context locally when available)
     prev_id = payload.get("previous_response_id")
     if isinstance(prev_id, str) and prev_id.strip():
         prior = _get_thread(prev_id.strip())
-        if isinstance(prior, list) and prior:
+        if prior:
             try:
-                input_items = prior + input_items
+                input_items = [*prior, *input_items]
             except Exception:
                 pass
 
@@ -421,30 +570,27 @@ def responses_stream() -> Response:
 
     # Passthrough Responses API tools (web_search) via extension fields, mirroring other routes
     extra_tools: List[Dict[str, Any]] = []
-    rt_payload = payload.get("responses_tools") if isinstance(payload.get("responses_tools"), list) else []
+    rt_payload = payload.get("responses_tools")
+    if not isinstance(rt_payload, list):
+        rt_payload = []
     had_responses_tools = False
-    if isinstance(rt_payload, list):
-        for _t in rt_payload:
-            if not (isinstance(_t, dict) and isinstance(_t.get("type"), str)):
-                continue
-            if _t.get("type") not in ("web_search", "web_search_preview"):
-                return jsonify({"error": {"message": "Only web_search/web_search_preview are supported in responses_tools"}}), 400
-            extra_tools.append(_t)
-        if not extra_tools and bool(current_app.config.get("DEFAULT_WEB_SEARCH")):
-            rtc = payload.get("responses_tool_choice")
-            if not (isinstance(rtc, str) and rtc == "none"):
-                extra_tools = [{"type": "web_search"}]
-        if extra_tools:
-            import json as _json
-            MAX_TOOLS_BYTES = 32768
-            try:
-                size = len(_json.dumps(extra_tools))
-            except Exception:
-                size = 0
-            if size > MAX_TOOLS_BYTES:
-                return jsonify({"error": {"message": "responses_tools too large", "code": "RESPONSES_TOOLS_TOO_LARGE"}}), 400
-            had_responses_tools = True
-            tools_responses = (tools_responses or []) + extra_tools
+    for _t in rt_payload:
+        if not (isinstance(_t, dict) and isinstance(_t.get("type"), str)):
+            continue
+        if _t.get("type") not in ("web_search", "web_search_preview"):
+            return json_response({"error": {"message": "Only web_search/web_search_preview are supported in responses_tools"}}, 400)
+        extra_tools.append(_t)
+    if extra_tools:
+        # Only client-supplied tools need the size cap; the default below is a fixed one-item list
+        if responses_tools_too_large(extra_tools):
+            return json_response({"error": {"message": "responses_tools too large", "code": "RESPONSES_TOOLS_TOO_LARGE"}}, 400)
+    elif settings.default_web_search:
+        rtc = payload.get("responses_tool_choice")
+        if not (isinstance(rtc, str) and rtc == "none"):
+            extra_tools = [{"type": "web_search"}]
+    if extra_tools:
+        had_responses_tools = True
+        tools_responses = (tools_responses or []) + extra_tools
 
     rtc = payload.get("responses_tool_choice")
     if isinstance(rtc, str) and rtc in ("auto", "none"):
@@ -452,9 +598,11 @@ def responses_stream() -> Response:
 
     # Instructions & reasoning
     # Flag to disable base-instructions injection for /v1/responses
-    no_base = bool(current_app.config.get("RESPONSES_NO_BASE_INSTRUCTIONS"))
-    base_inst = _instructions_for_model(model)
-    user_inst = payload.get("instructions") if isinstance(payload.get("instructions"), str) else None
+    no_base = settings.responses_no_base_instructions
+    base_inst = instructions_for_model(model)
+    user_inst = payload.get("instructions")
+    if not isinstance(user_inst, str):
+        user_inst = None
     if no_base:
         # Forward client 'instructions' as-is; if missing, inject a minimal stub
         if isinstance(user_inst, str) and user_inst.strip():
@@ -472,51 +620,39 @@ def responses_stream() -> Response:
     active_prompt_type = prompt_key if (not no_base and isinstance(instructions, str)) else None
 
     model_reasoning = extract_reasoning_from_model_name(requested_model)
-    reasoning_overrides = payload.get("reasoning") if isinstance(payload.get("reasoning"), dict) else model_reasoning
+    reasoning_overrides = payload.get("reasoning")
+    if not isinstance(reasoning_overrides, dict):
+        reasoning_overrides = model_reasoning
     reasoning_param = build_reasoning_param(reasoning_effort, reasoning_summary, reasoning_overrides)
 
-    # Pass-through of additional Responses API fields
-    # Note: we intentionally DO NOT forward "store" upstream.
-    # The ChatGPT codex/responses upstream rejects it (400 "Store must be set to false").
-    # We still honor client "store" locally for non-stream aggregation and GET retrieval.
-    passthrough_keys = [
-        "temperature",
-        "top_p",
-        # tokens params are not forwarded to ChatGPT codex/responses; it rejects both
-        "seed",
-        "stop",
-        "text",
-        "metadata",
-        "include",
-        "top_logprobs",
-        "truncation",
-    ]
+    # Pass-through of additional Responses API fields (see _PASSTHROUGH_KEYS)
     extra_fields: Dict[str, Any] = {}
     # Strip any tokens params that upstream rejects
-    if "max_output_tokens" in payload and payload.get("max_output_tokens") is not None:
+    if payload.get("max_output_tokens") is not None:
         try:
             _log_event("param_stripped", param="max_output_tokens", reason="unsupported_by_upstream")
         except Exception:
             pass
-    if "max_completion_tokens" in payload and payload.get("max_completion_tokens") is not None:
+    if payload.get("max_completion_tokens") is not None:
         try:
             _log_event("param_stripped", param="max_completion_tokens", reason="unsupported_by_upstream")
         except Exception:
             pass
-    for k in passthrough_keys:
-        if k in payload and payload.get(k) is not None:
-            extra_fields[k] = payload.get(k)
+    for k in _PASSTHROUGH_KEYS:
+        v = payload.get(k)
+        if v is not None:
+            extra_fields[k] = v
 
     # Never forward client "store" to upstream; keep it local-only.
     # Upstream codex/responses requires store=false and 400s otherwise.
-    if "store" in payload and payload.get("store") is not None:
+    if payload.get("store") is not None:
         try:
             _log_event("param_stripped", param="store", reason="local_only_not_forwarded")
         except Exception:
             pass
 
     # Never forward client "previous_response_id" upstream; handle threading locally only.
-    if "previous_response_id" in payload and payload.get("previous_response_id") is not None:
+    if payload.get("previous_response_id") is not None:
         try:
             _log_event("param_stripped", param="previous_response_id", reason="local_thread_only")
         except Exception:
@@ -545,7 +681,8 @@ def responses_stream() -> Response:
             include=extra_fields.get("include"),
         )
         try:
-            err_body = json.loads(upstream.content.decode("utf-8", errors="ignore")) if upstream.content else {"raw": upstream.text}
+            err_raw = upstream.content
+            err_body = loads(err_raw) if err_raw else {"raw": upstream.text}
         except Exception:
             err_body = {"raw": upstream.text}
         try:
@@ -574,8 +711,7 @@ def responses_stream() -> Response:
         if isinstance(raw_txt, str):
             payload_error["raw"] = raw_txt
         try:
-            import sys
-            print(
+            vlog(
                 f"[UPSTREAM_ERROR] route=/v1/responses status={upstream.status_code} message={message}",
                 file=sys.stderr,
             )
@@ -589,12 +725,12 @@ def responses_stream() -> Response:
             and "instruction" in failure_hint.lower()
         ):
             mark_prompt_invalid(active_prompt_type, instructions_used, failure_hint)
-        return jsonify({"error": payload_error}), upstream.status_code
+        return json_response({"error": payload_error}, upstream.status_code)
 
     if stream_req:
         def _passthrough():
             try:
-                for chunk in upstream.iter_content(chunk_size=8192):
+                for chunk in iter_upstream_chunks(upstream):
                     if not chunk:
                         continue
                     yield chunk
@@ -621,69 +757,21 @@ def responses_stream() -> Response:
             status=upstream.status_code,
             mimetype="text/event-stream",
             headers={"Cache-Control": "no-cache", "Connection": "keep-alive"},
+            direct_passthrough=True,
         )
-        for k, v in build_cors_headers().items():
-            resp.headers.setdefault(k, v)
+        apply_cors_headers(resp)
         _log_event("stream_start", upstream_status=upstream.status_code, model=model)
         return resp
 
     # Non-stream aggregation: build a Responses object
     created = int(time.time())
-    response_id = "resp_nonstream"
-    usage_obj: Dict[str, int] | None = None
-    full_text = ""
-    output_items: List[Dict[str, Any]] = []
-
-    def _extract_usage(evt: Dict[str, Any]) -> Dict[str, int] | None:
-        try:
-            usage = (evt.get("response") or {}).get("usage")
-            if not isinstance(usage, dict):
-                return None
-            pt = int(usage.get("input_tokens") or 0)
-            ct = int(usage.get("output_tokens") or 0)
-            tt = int(usage.get("total_tokens") or (pt + ct))
-            return {"prompt_tokens": pt, "completion_tokens": ct, "total_tokens": tt}
-        except Exception:
-            return None
-
-    try:
-        for raw_line in upstream.iter_lines(decode_unicode=False):
-            if not raw_line:
-                continue
-            line = raw_line.decode("utf-8", errors="ignore") if isinstance(raw_line, (bytes, bytearray)) else raw_line
-            if not line.startswith("data: "):
-                continue
-            data = line[len("data: "):].strip()
-            if not data or data == "[DONE]":
-                if data == "[DONE]":
-                    break
-                continue
-            try:
-                evt = json.loads(data)
-            except Exception:
-                continue
-            if isinstance(evt.get("response"), dict) and isinstance(evt["response"].get("id"), str):
-                response_id = evt["response"].get("id") or response_id
-            mu = _extract_usage(evt)
-            if mu:
-                usage_obj = mu
-            kind = evt.get("type")
-            if kind == "response.output_text.delta":
-                full_text += evt.get("delta") or ""
-            elif kind == "response.output_item.done":
-                item = evt.get("item") or {}
-                if isinstance(item, dict) and item.get("type") in ("function_call", "web_search_call"):
-                    output_items.append(item)
-            elif kind == "response.failed":
-                err_msg = evt.get("response", {}).get("error", {}).get("message", "response.failed")
-                return jsonify({"error": {"message": err_msg}}), 502
-            elif kind == "response.completed":
-                break
-    finally:
-        try:
-            upstream.close()
-        except Exception:
-            pass
+    result = consume_sse(upstream, RESPONSES_KINDS)
+    if result.error_message:
+        return json_response({"error": {"message": result.error_message}}, 502)
+    response_id = result.response_id or "resp_nonstream"
+    usage_obj = result.usage
+    full_text = result.full_text
+    output_items = result.output_items
 
     output: List[Dict[str, Any]] = []
     if full_text:
@@ -706,18 +794,21 @@ def responses_stream() -> Response:
         # Responses usage schema uses prompt/completion/total; we attach as-is
         resp_obj["usage"] = usage_obj
 
+    # Encoded once: the same bytes are returned now and kept for GET retrieval
+    body = dumps(resp_obj)
+
     # Persist if client asked to store
     try:
         should_store = bool(payload.get("store"))
         if should_store:
-            _store_response(resp_obj, max_items=int(current_app.config.get("STORE_MAX", 200)))
+            _store_response(response_id, body, max_items=int(current_app.config.get("STORE_MAX", 200)))
     except Exception:
         pass
 
     # Build a simple next-turn thread input for previous_response_id simulation
     try:
         # Start from the original request input (which may have been augmented by prev threading)
-        thread_items = list(input_items) if isinstance(input_items, list) else []
+        thread_items = _new_thread(input_items if isinstance(input_items, list) else ())
         if full_text:
             thread_items.append({
                 "role": "assistant",
@@ -727,9 +818,7 @@ def responses_stream() -> Response:
     except Exception:
         pass
 
-    resp = make_response(jsonify(resp_obj), 200)
-    for k, v in build_cors_headers().items():
-        resp.headers.setdefault(k, v)
+    resp = apply_cors_headers(Response(body, status=200, mimetype="application/json"))
     try:
         _log_event(
             "nonstream_aggregated",
@@ -746,11 +835,9 @@ def responses_stream() -> Response:
 
 @responses_bp.route("/v1/responses/<rid>", methods=["GET"])
 def responses_get(rid: str) -> Response:
-    obj = _get_response(rid)
-    if not obj:
-        return jsonify({"error": {"message": "Not found"}}), 404
-    resp = make_response(jsonify(obj), 200)
-    for k, v in build_cors_headers().items():
-        resp.headers.setdefault(k, v)
+    body = _get_response(rid)
+    if not body:
+        return json_response({"error": {"message": "Not found"}}, 404)
+    resp = apply_cors_headers(Response(body, status=200, mimetype="application/json"))
     _log_event("get_response", id=rid, found=True)
     return resp
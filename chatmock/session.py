@@ -4,14 +4,27 @@ import hashlib
 import json
 import threading
 import uuid
+from collections import OrderedDict
 from typing import Any, Dict, List, Tuple
 
+try:
+    from blake3 import blake3 as _blake3
+except ImportError:
+    _blake3 = None
+
+from .config import BASE_INSTRUCTIONS, GPT5_CODEX_INSTRUCTIONS
+
 
 _LOCK = threading.Lock()
-_FINGERPRINT_TO_UUID: Dict[str, str] = {}
-_ORDER: List[str] = []
+_FINGERPRINT_TO_UUID: "OrderedDict[str, str]" = OrderedDict()
 _MAX_ENTRIES = 10000
 
+# The prompt-file instructions are the same str objects on every turn, so their digests are
+# cached by identity. Client-supplied instructions are new strings each request and are
+# hashed without being kept.
+_PROMPT_FILE_INSTRUCTIONS = (BASE_INSTRUCTIONS, GPT5_CODEX_INSTRUCTIONS)
+_INSTRUCTIONS_DIGESTS: Dict[int, str] = {}
+
 
 def _canonicalize_first_user_message(input_items: List[Dict[str, Any]]) -> Dict[str, Any] | None:
     """
@@ -46,28 +59,47 @@ def _canonicalize_first_user_message(input_items: List[Dict[str, Any]]) -> Dict[
     return None
 
 
-def canonicalize_prefix(instructions: str | None, input_items: List[Dict[str, Any]]) -> str:
-    prefix: Dict[str, Any] = {}
-    if isinstance(instructions, str) and instructions.strip():
-        prefix["instructions"] = instructions.strip()
-    first_user = _canonicalize_first_user_message(input_items)
-    if first_user is not None:
-        prefix["first_user_message"] = first_user
-    return json.dumps(prefix, sort_keys=True, separators=(",", ":"))
+# The fingerprint only keys the in-process session map, so speed matters more than strength:
+# BLAKE3 when installed, otherwise hashlib's BLAKE2b, both well ahead of SHA-256.
+if _blake3 is not None:
+    def _fingerprint(data: bytes) -> str:
+        return _blake3(data).hexdigest()
+else:
+    def _fingerprint(data: bytes) -> str:
+        return hashlib.blake2b(data, digest_size=16).hexdigest()
 
 
-def _fingerprint(s: str) -> str:
-    return hashlib.sha256(s.encode("utf-8")).hexdigest()
+def _instructions_digest(instructions: str | None) -> str:
+    if not isinstance(instructions, str):
+        return ""
+    cacheable = any(instructions is text for text in _PROMPT_FILE_INSTRUCTIONS)
+    if cacheable:
+        digest = _INSTRUCTIONS_DIGESTS.get(id(instructions))
+        if digest is not None:
+            return digest
+    stripped = instructions.strip()
+    digest = _fingerprint(stripped.encode("utf-8")) if stripped else ""
+    if cacheable:
+        _INSTRUCTIONS_DIGESTS[id(instructions)] = digest
+    return digest
+
+
+def canonicalize_prefix(instructions: str | None, input_items: List[Dict[str, Any]]) -> bytes:
+    """Stable byte prefix for fingerprinting: the instructions digest plus the first user message."""
+    first_user = _canonicalize_first_user_message(input_items)
+    user_part = b""
+    if first_user is not None:
+        user_part = json.dumps(first_user, sort_keys=True, separators=(",", ":")).encode("utf-8")
+    return _instructions_digest(instructions).encode("ascii") + b"\n" + user_part
 
 
 def _remember(fp: str, sid: str) -> None:
     if fp in _FINGERPRINT_TO_UUID:
+        _FINGERPRINT_TO_UUID.move_to_end(fp)
         return
     _FINGERPRINT_TO_UUID[fp] = sid
-    _ORDER.append(fp)
-    if len(_ORDER) > _MAX_ENTRIES:
-        oldest = _ORDER.pop(0)
-        _FINGERPRINT_TO_UUID.pop(oldest, None)
+    if len(_FINGERPRINT_TO_UUID) > _MAX_ENTRIES:
+        _FINGERPRINT_TO_UUID.popitem(last=False)
 
 
 def ensure_session_id(
@@ -78,11 +110,12 @@ def ensure_session_id(
     if isinstance(client_supplied, str) and client_supplied.strip():
         return client_supplied.strip()
 
-    canon = canonicalize_prefix(instructions, input_items)
-    fp = _fingerprint(canon)
+    fp = _fingerprint(canonicalize_prefix(instructions, input_items))
     with _LOCK:
-        if fp in _FINGERPRINT_TO_UUID:
-            return _FINGERPRINT_TO_UUID[fp]
+        sid = _FINGERPRINT_TO_UUID.get(fp)
+        if sid is not None:
+            _FINGERPRINT_TO_UUID.move_to_end(fp)
+            return sid
         sid = str(uuid.uuid4())
         _remember(fp, sid)
         return sid
@@ -0,0 +1,57 @@
+from __future__ import annotations
+
+from functools import lru_cache
+from typing import NamedTuple
+
+from flask import Flask, current_app
+
+from .config import BASE_INSTRUCTIONS, GPT5_CODEX_INSTRUCTIONS
+
+
+class Settings(NamedTuple):
+    verbose: bool
+    reasoning_effort: str
+    reasoning_summary: str
+    reasoning_compat: str
+    debug_model: str | None
+    default_web_search: bool
+    expose_reasoning_models: bool
+    responses_no_base_instructions: bool
+
+
+@lru_cache(maxsize=8)
+def _settings_for(app: Flask) -> Settings:
+    config = app.config
+    return Settings(
+        verbose=bool(config.get("VERBOSE")),
+        reasoning_effort=config.get("REASONING_EFFORT", "medium"),
+        reasoning_summary=config.get("REASONING_SUMMARY", "auto"),
+        reasoning_compat=config.get("REASONING_COMPAT", "think-tags"),
+        debug_model=config.get("DEBUG_MODEL"),
+        default_web_search=bool(config.get("DEFAULT_WEB_SEARCH")),
+        expose_reasoning_models=bool(config.get("EXPOSE_REASONING_MODELS")),
+        responses_no_base_instructions=bool(config.get("RESPONSES_NO_BASE_INSTRUCTIONS")),
+    )
+
+
+def get_settings() -> Settings:
+    """Route settings for the current app.
+
+    The app config is only written in create_app, so the snapshot is taken once per app.
+    """
+    return _settings_for(current_app._get_current_object())
+
+
+@lru_cache(maxsize=8)
+def _resolve_instructions(app: Flask, is_codex: bool) -> str:
+    base = app.config.get("BASE_INSTRUCTIONS", BASE_INSTRUCTIONS)
+    if is_codex:
+        codex = app.config.get("GPT5_CODEX_INSTRUCTIONS") or GPT5_CODEX_INSTRUCTIONS
+        if isinstance(codex, str) and codex.strip():
+            return codex
+    return base
+
+
+def instructions_for_model(model: str) -> str:
+    """Base instructions sent upstream for ``model``, resolved once per app."""
+    return _resolve_instructions(current_app._get_current_object(), model == "gpt-5-codex")
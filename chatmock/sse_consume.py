@@ -0,0 +1,189 @@
+from __future__ import annotations
+
+import re
+import sys
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Any, Callable, Dict, FrozenSet, List, NamedTuple
+
+from .fastjson import loads
+from .utils import extract_usage, iter_sse_lines
+
+
+class ToolCall(NamedTuple):
+    id: str
+    name: str
+    arguments: str
+
+    def as_chat(self) -> Dict[str, Any]:
+        return {"id": self.id, "type": "function", "function": {"name": self.name, "arguments": self.arguments}}
+
+
+@dataclass
+class ConsumeResult:
+    response_id: str | None = None
+    usage: Dict[str, int] | None = None
+    full_parts: List[str] = field(default_factory=list)
+    reasoning_summary_parts: List[str] = field(default_factory=list)
+    reasoning_full_parts: List[str] = field(default_factory=list)
+    tool_call_parts: List[ToolCall] = field(default_factory=list)
+    output_items: List[Dict[str, Any]] = field(default_factory=list)
+    error_message: str | None = None
+
+    @property
+    def full_text(self) -> str:
+        return "".join(self.full_parts)
+
+    @property
+    def reasoning_summary_text(self) -> str:
+        return "".join(self.reasoning_summary_parts)
+
+    @property
+    def reasoning_full_text(self) -> str:
+        return "".join(self.reasoning_full_parts)
+
+    @property
+    def tool_calls(self) -> List[Dict[str, Any]]:
+        """Tool calls in the Chat Completions shape, built once aggregation is done."""
+        return [tc.as_chat() for tc in self.tool_call_parts]
+
+    @property
+    def saw_reasoning(self) -> bool:
+        return bool(self.reasoning_summary_parts or self.reasoning_full_parts)
+
+
+# Output items kept verbatim for callers that rebuild a Responses object
+_PASSTHROUGH_ITEM_TYPES = frozenset({"function_call", "web_search_call"})
+
+
+def _h_output_text(evt: Dict[str, Any], result: ConsumeResult) -> None:
+    delta = evt.get("delta")
+    if delta:
+        result.full_parts.append(delta)
+
+
+def _h_reasoning_summary(evt: Dict[str, Any], result: ConsumeResult) -> None:
+    delta = evt.get("delta")
+    if delta:
+        result.reasoning_summary_parts.append(delta)
+
+
+def _h_reasoning_text(evt: Dict[str, Any], result: ConsumeResult) -> None:
+    delta = evt.get("delta")
+    if delta:
+        result.reasoning_full_parts.append(delta)
+
+
+def _h_output_item_done(evt: Dict[str, Any], result: ConsumeResult) -> None:
+    item = evt.get("item") or {}
+    if not isinstance(item, dict):
+        return
+    item_type = item.get("type")
+    if item_type in _PASSTHROUGH_ITEM_TYPES:
+        result.output_items.append(item)
+    if item_type == "function_call":
+        call_id = item.get("call_id") or item.get("id") or ""
+        name = item.get("name") or ""
+        args = item.get("arguments") or ""
+        if isinstance(call_id, str) and isinstance(name, str) and isinstance(args, str):
+            result.tool_call_parts.append(ToolCall(call_id, name, args))
+
+
+def _h_failed(evt: Dict[str, Any], result: ConsumeResult) -> None:
+    result.error_message = evt.get("response", {}).get("error", {}).get("message", "response.failed")
+
+
+K_OUTPUT_TEXT_DELTA = sys.intern("response.output_text.delta")
+K_REASONING_SUMMARY_DELTA = sys.intern("response.reasoning_summary_text.delta")
+K_REASONING_TEXT_DELTA = sys.intern("response.reasoning_text.delta")
+K_OUTPUT_ITEM_DONE = sys.intern("response.output_item.done")
+K_FAILED = sys.intern("response.failed")
+K_COMPLETED = sys.intern("response.completed")
+K_CREATED = sys.intern("response.created")
+K_REASONING_SUMMARY_PART_ADDED = sys.intern("response.reasoning_summary_part.added")
+
+# Only terminal events carry a usage block; these plus response.created carry the response object
+_USAGE_KINDS: FrozenSet[str] = frozenset({K_COMPLETED, K_FAILED})
+_RESPONSE_KINDS: FrozenSet[str] = _USAGE_KINDS | {K_CREATED}
+
+# response.completed has no handler: the consumer loop ends on it when it is wanted.
+_HANDLERS: Dict[str, Callable[[Dict[str, Any], ConsumeResult], None]] = {
+    K_OUTPUT_TEXT_DELTA: _h_output_text,
+    K_REASONING_SUMMARY_DELTA: _h_reasoning_summary,
+    K_REASONING_TEXT_DELTA: _h_reasoning_text,
+    K_OUTPUT_ITEM_DONE: _h_output_item_done,
+    K_FAILED: _h_failed,
+}
+
+CHAT_KINDS: FrozenSet[str] = frozenset(_HANDLERS) | {K_COMPLETED}
+TEXT_KINDS: FrozenSet[str] = frozenset({K_OUTPUT_TEXT_DELTA, K_COMPLETED})
+RESPONSES_KINDS: FrozenSet[str] = frozenset({K_OUTPUT_TEXT_DELTA, K_OUTPUT_ITEM_DONE, K_FAILED, K_COMPLETED})
+
+
+@lru_cache(maxsize=8)
+def _handlers_for(wanted_kinds: FrozenSet[str]) -> Dict[str, Callable[[Dict[str, Any], ConsumeResult], None]]:
+    return {kind: handler for kind, handler in _HANDLERS.items() if kind in wanted_kinds}
+
+
+@lru_cache(maxsize=8)
+def _peek_pattern_for(wanted_kinds: FrozenSet[str]) -> re.Pattern:
+    # response.created is always parsed so the response id is known even if the stream is cut short
+    kinds = sorted(wanted_kinds | {K_CREATED})
+    return re.compile(b"|".join(re.escape(f'"{kind}"'.encode("ascii")) for kind in kinds))
+
+
+def consume_sse(upstream, wanted_kinds: FrozenSet[str] = CHAT_KINDS) -> ConsumeResult:
+    """Drain an upstream Responses SSE stream into a ConsumeResult.
+
+    Only events whose type is in ``wanted_kinds`` are aggregated; the handler map is
+    specialized per kind set so unwanted branches are never consulted. The upstream
+    response is always closed.
+    """
+    # Hot names are bound to locals; the loop runs once per upstream event
+    get_handler = _handlers_for(wanted_kinds).get
+    peek = _peek_pattern_for(wanted_kinds).search
+    stop_on_completed = K_COMPLETED in wanted_kinds
+    response_kinds = _RESPONSE_KINDS
+    usage_kinds = _USAGE_KINDS
+    _loads = loads
+    result = ConsumeResult()
+    try:
+        for raw in iter_sse_lines(upstream):
+            if not raw.startswith(b"data: "):
+                continue
+            data = raw[6:].strip()
+            # Events are single-line JSON objects, so the [DONE] sentinel is only checked
+            # on the rare lines that are not; anything else is truncated or not ours
+            if not data.endswith(b"}"):
+                if data == b"[DONE]":
+                    break
+                continue
+            # Cheap scan (one C-level regex pass) so events we would drop are never JSON-decoded
+            if peek(data) is None:
+                continue
+            try:
+                evt = _loads(data)
+            except Exception:
+                continue
+            if not isinstance(evt, dict) or "type" not in evt:
+                continue
+            kind = evt["type"]
+            if kind in response_kinds:
+                resp = evt.get("response")
+                if isinstance(resp, dict) and isinstance(resp.get("id"), str):
+                    result.response_id = resp["id"] or result.response_id
+                if kind in usage_kinds:
+                    mu = extract_usage(evt)
+                    if mu:
+                        result.usage = mu
+            handler = get_handler(kind)
+            if handler is not None:
+                handler(evt, result)
+                if kind == K_FAILED:
+                    break
+            elif stop_on_completed and kind == K_COMPLETED:
+                break
+    finally:
+        # Closing (rather than draining) drops whatever trails the terminal event
+        upstream.close()
+    return result
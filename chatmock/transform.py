@@ -3,6 +3,14 @@ from __future__ import annotations
 import json
 from typing import Any, Dict, List
 
+# Base64 signatures of the image formats clients send; anything else is labelled PNG
+_BASE64_IMAGE_KINDS = (
+    ("/9j/", "image/jpeg"),
+    ("iVBORw0KGgo", "image/png"),
+    ("R0lGOD", "image/gif"),
+)
+_STRIP_NEWLINES = str.maketrans("", "", "\r\n")
+
 
 def to_data_url(image_str: str) -> str:
     if not isinstance(image_str, str) or not image_str:
@@ -10,16 +18,15 @@ def to_data_url(image_str: str) -> str:
     s = image_str.strip()
     if s.startswith("data:image/"):
         return s
-    if s.startswith("http://") or s.startswith("https://"):
+    if s.startswith(("http://", "https://")):
         return s
-    b64 = s.replace("\n", "").replace("\r", "")
+    # Clients rarely wrap base64, so only copy the string when there is something to drop
+    b64 = s.translate(_STRIP_NEWLINES) if ("\n" in s or "\r" in s) else s
     kind = "image/png"
-    if b64.startswith("/9j/"):
-        kind = "image/jpeg"
-    elif b64.startswith("iVBORw0KGgo"):
-        kind = "image/png"
-    elif b64.startswith("R0lGOD"):
-        kind = "image/gif"
+    for prefix, prefix_kind in _BASE64_IMAGE_KINDS:
+        if b64.startswith(prefix):
+            kind = prefix_kind
+            break
     return f"data:{kind};base64,{b64}"
 
 
@@ -147,3 +154,18 @@ def normalize_ollama_tools(tools: List[Dict[str, Any]] | None) -> List[Dict[str,
             )
     return out
 
+
+def hoist_system_message(messages: List[Any]) -> List[Any]:
+    """Move the first system message to the front as a user turn, in a single pass."""
+    # Slot 0 is reserved for the hoisted turn so the result never needs a shift or a concat
+    out: List[Any] = [None]
+    sys_msg = None
+    for m in messages:
+        if sys_msg is None and isinstance(m, dict) and m.get("role") == "system":
+            sys_msg = m
+        else:
+            out.append(m)
+    if sys_msg is None:
+        return messages
+    out[0] = {"role": "user", "content": sys_msg.get("content")}
+    return out
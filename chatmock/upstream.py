@@ -1,42 +1,75 @@
 from __future__ import annotations
 
+import re
+from http.cookiejar import DefaultCookiePolicy
 from typing import Any, Dict, List
 
 import requests
-from flask import jsonify, make_response
 from flask import request as flask_request
+from requests.adapters import HTTPAdapter
 
 from .config import CHATGPT_RESPONSES_URL
-from .http import build_cors_headers
+from .fastjson import dumps
+from .http import json_response
 from .session import ensure_session_id
 from .utils import get_effective_chatgpt_auth
 
 
+class _RejectCookies(DefaultCookiePolicy):
+    def set_ok(self, cookie, request) -> bool:
+        return False
+
+
+def _build_session() -> requests.Session:
+    session = requests.Session()
+    # Upstream calls carry per-user auth headers; never let one call's cookies leak into the next
+    session.cookies.set_policy(_RejectCookies())
+    # A gevent worker runs many streams at once; connections beyond pool_maxsize still
+    # open but are closed rather than kept when released, so size it for that concurrency
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=256, max_retries=0)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+# Shared so keep-alive connections (and their TLS sessions) survive across requests,
+# including the retry-without-tools path that calls start_upstream_request twice
+_SESSION = _build_session()
+
+
+# Strips one "-<effort>" suffix, then one "_<effort>" suffix before it, case-insensitively
+_EFFORT_SUFFIX_RE = re.compile(
+    r"(?:_(?:minimal|low|medium|high))?(?:-(?:minimal|low|medium|high))?$",
+    re.IGNORECASE,
+)
+
+_MODEL_ALIASES: Dict[str, str] = {
+    "gpt5": "gpt-5",
+    "gpt-5-latest": "gpt-5",
+    "gpt-5": "gpt-5",
+    "gpt5-codex": "gpt-5-codex",
+    "gpt-5-codex": "gpt-5-codex",
+    "gpt-5-codex-latest": "gpt-5-codex",
+    "codex": "codex-mini-latest",
+    "codex-mini": "codex-mini-latest",
+    "codex-mini-latest": "codex-mini-latest",
+}
+
+# Client fields never forwarded: streaming must stay on, and nothing is stored upstream
+_UPSTREAM_REJECT_KEYS = frozenset({"stream", "store"})
+
+# Shared empty tools value; both JSON encoders write a tuple as a list
+_NO_TOOLS = ()
+
+
 def normalize_model_name(name: str | None, debug_model: str | None = None) -> str:
     if isinstance(debug_model, str) and debug_model.strip():
         return debug_model.strip()
     if not isinstance(name, str) or not name.strip():
         return "gpt-5"
     base = name.split(":", 1)[0].strip()
-    for sep in ("-", "_"):
-        lowered = base.lower()
-        for effort in ("minimal", "low", "medium", "high"):
-            suffix = f"{sep}{effort}"
-            if lowered.endswith(suffix):
-                base = base[: -len(suffix)]
-                break
-    mapping = {
-        "gpt5": "gpt-5",
-        "gpt-5-latest": "gpt-5",
-        "gpt-5": "gpt-5",
-        "gpt5-codex": "gpt-5-codex",
-        "gpt-5-codex": "gpt-5-codex",
-        "gpt-5-codex-latest": "gpt-5-codex",
-        "codex": "codex-mini-latest",
-        "codex-mini": "codex-mini-latest",
-        "codex-mini-latest": "codex-mini-latest",
-    }
-    return mapping.get(base, base)
+    base = _EFFORT_SUFFIX_RE.sub("", base, count=1)
+    return _MODEL_ALIASES.get(base, base)
 
 
 def start_upstream_request(
@@ -52,18 +85,14 @@ def start_upstream_request(
 ):
     access_token, account_id = get_effective_chatgpt_auth()
     if not access_token or not account_id:
-        resp = make_response(
-            jsonify(
-                {
-                    "error": {
-                        "message": "Missing ChatGPT credentials. Run 'python3 chatmock.py login' first.",
-                    },
+        resp = json_response(
+            {
+                "error": {
+                    "message": "Missing ChatGPT credentials. Run 'python3 chatmock.py login' first.",
                 },
-            ),
+            },
             401,
         )
-        for k, v in build_cors_headers().items():
-            resp.headers.setdefault(k, v)
         return None, resp
 
     include: List[str] = []
@@ -85,13 +114,17 @@ def start_upstream_request(
         )
     except Exception:
         client_session_id = None
-    session_id = ensure_session_id(instructions, input_items, client_session_id)
+    if client_session_id and client_session_id.strip():
+        # A client-supplied id wins, so skip walking and hashing the input prefix.
+        session_id = client_session_id.strip()
+    else:
+        session_id = ensure_session_id(instructions, input_items, None)
 
     responses_payload = {
         "model": model,
-        "instructions": instructions if isinstance(instructions, str) and instructions.strip() else instructions,
+        "instructions": instructions,
         "input": input_items,
-        "tools": tools or [],
+        "tools": tools or _NO_TOOLS,
         "tool_choice": tool_choice if tool_choice in ("auto", "none") or isinstance(tool_choice, dict) else "auto",
         "parallel_tool_calls": bool(parallel_tool_calls),
         "store": False,
@@ -106,14 +139,9 @@ def start_upstream_request(
 
     # Merge extra fields (temperature, top_p, text, metadata, etc.)
     if isinstance(extra_fields, dict):
-        for k, v in extra_fields.items():
-            # Never allow client to disable streaming here
-            if k == "stream":
-                continue
-            # Never forward client-provided 'store' upstream
-            if k == "store":
-                continue
-            responses_payload[k] = v
+        responses_payload.update(
+            {k: v for k, v in extra_fields.items() if k not in _UPSTREAM_REJECT_KEYS}
+        )
 
     headers = {
         "Authorization": f"Bearer {access_token}",
@@ -125,16 +153,15 @@ def start_upstream_request(
     }
 
     try:
-        upstream = requests.post(
+        upstream = _SESSION.post(
             CHATGPT_RESPONSES_URL,
             headers=headers,
-            json=responses_payload,
+            # Content-Type is already set above; orjson hands back the body as bytes
+            data=dumps(responses_payload),
             stream=True,
             timeout=600,
         )
     except requests.RequestException as e:
-        resp = make_response(jsonify({"error": {"message": f"Upstream ChatGPT request failed: {e}"}}), 502)
-        for k, v in build_cors_headers().items():
-            resp.headers.setdefault(k, v)
+        resp = json_response({"error": {"message": f"Upstream ChatGPT request failed: {e}"}}, 502)
         return None, resp
     return upstream, None
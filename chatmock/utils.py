@@ -1,23 +1,92 @@
 from __future__ import annotations
 
+import atexit
 import base64
 import datetime
 import hashlib
 import json
 import os
+import queue
+import re
 import secrets
 import sys
+import threading
 from typing import Any, Dict, List, Optional, Tuple
 
 import requests
 
 from .config import CLIENT_ID_DEFAULT, OAUTH_TOKEN_URL
+from .fastjson import dumps, loads
 
 
 def eprint(*args, **kwargs) -> None:
     print(*args, file=sys.stderr, **kwargs)
 
 
+_VLOG_QUEUE: "queue.Queue[Tuple[bool, str]]" = queue.Queue(maxsize=1024)
+_VLOG_THREAD: threading.Thread | None = None
+_VLOG_THREAD_LOCK = threading.Lock()
+
+
+def _write_vlog_lines(lines: List[Tuple[bool, str]]) -> None:
+    # Consecutive lines for the same stream go out in one write
+    start = 0
+    while start < len(lines):
+        to_stderr = lines[start][0]
+        end = start + 1
+        while end < len(lines) and lines[end][0] == to_stderr:
+            end += 1
+        stream = sys.stderr if to_stderr else sys.stdout
+        try:
+            stream.write("\n".join(line for _, line in lines[start:end]) + "\n")
+            stream.flush()
+        except Exception:
+            pass
+        start = end
+
+
+def _drain_vlog_queue(block: bool = True) -> None:
+    while True:
+        try:
+            lines = [_VLOG_QUEUE.get(block=block)]
+        except queue.Empty:
+            return
+        while True:
+            try:
+                lines.append(_VLOG_QUEUE.get_nowait())
+            except queue.Empty:
+                break
+        _write_vlog_lines(lines)
+
+
+def _ensure_vlog_thread() -> None:
+    global _VLOG_THREAD
+    if _VLOG_THREAD is not None and _VLOG_THREAD.is_alive():
+        return
+    with _VLOG_THREAD_LOCK:
+        if _VLOG_THREAD is not None and _VLOG_THREAD.is_alive():
+            return
+        _VLOG_THREAD = threading.Thread(target=_drain_vlog_queue, name="chatmock-vlog", daemon=True)
+        _VLOG_THREAD.start()
+
+
+def vlog(*args, file=None) -> None:
+    """print()-compatible verbose logger that hands the line to a background writer.
+
+    Keeps stdout/stderr locking and the write syscall off the request thread. Pass
+    ``file=sys.stderr`` for lines meant for the error log. Lines are dropped if the
+    writer falls more than 1024 lines behind.
+    """
+    _ensure_vlog_thread()
+    try:
+        _VLOG_QUEUE.put_nowait((file is sys.stderr, " ".join(str(a) for a in args)))
+    except queue.Full:
+        pass
+
+
+atexit.register(_drain_vlog_queue, False)
+
+
 def get_home_dir() -> str:
     home = os.getenv("CHATGPT_LOCAL_HOME") or os.getenv("CODEX_HOME")
     if not home:
@@ -219,6 +288,21 @@ def convert_tools_chat_to_responses(tools: Any) -> List[Dict[str, Any]]:
     return out
 
 
+MAX_RESPONSES_TOOLS_BYTES = 32768
+
+
+def responses_tools_too_large(tools: List[Dict[str, Any]]) -> bool:
+    """True when ``tools`` encode to more than MAX_RESPONSES_TOOLS_BYTES.
+
+    The request body is no bound here: re-encoding can grow it (``1e9`` comes back as
+    ``1000000000.0``), so the tools are always measured.
+    """
+    try:
+        return len(dumps(tools)) > MAX_RESPONSES_TOOLS_BYTES
+    except Exception:
+        return False
+
+
 def load_chatgpt_tokens(ensure_fresh: bool = True) -> tuple[str | None, str | None, str | None]:
     auth = read_auth_file()
     if not isinstance(auth, dict):
@@ -374,6 +458,87 @@ def get_effective_chatgpt_auth() -> tuple[str | None, str | None]:
     return access_token, account_id
 
 
+_SSE_SCRATCH = threading.local()
+_SSE_SCRATCH_MAX = 1 << 20
+
+
+def iter_upstream_chunks(upstream, chunk_size: int = 65536):
+    """Yield decoded body bytes from a streamed upstream response as soon as they arrive.
+
+    ``read1`` returns whatever the socket already has (up to ``chunk_size``) instead of
+    waiting for a full block, so relayed events are not held back behind later ones.
+    """
+    read1 = getattr(upstream.raw, "read1", None)
+    if read1 is not None:
+        return iter(lambda: read1(chunk_size, decode_content=True), b"")
+    return upstream.iter_content(chunk_size=chunk_size)
+
+
+def iter_sse_lines(upstream, chunk_size: int = 65536):
+    """Yield raw SSE lines (bytes, without line terminators) from a streamed upstream response.
+
+    Reads whatever the socket has ready in chunks of up to ``chunk_size`` bytes into a single
+    reusable buffer and slices complete lines out of it by offset, trimming the consumed
+    prefix once per read rather than once per line. The buffer is borrowed from a per-thread
+    slot and handed back afterwards, so consecutive requests on a worker reuse it.
+    """
+    chunks = iter_upstream_chunks(upstream, chunk_size)
+    buf = getattr(_SSE_SCRATCH, "buf", None)
+    if buf is None:
+        buf = bytearray()
+    else:
+        # Take it out of the slot so a nested reader on this thread gets its own
+        _SSE_SCRATCH.buf = None
+    try:
+        for chunk in chunks:
+            if not chunk:
+                continue
+            # Bytes already in the buffer hold no newline, so only the new data needs scanning
+            scan_from = len(buf)
+            buf += chunk
+            pos = 0
+            nl = buf.find(b"\n", scan_from)
+            if nl == -1:
+                continue
+            view = memoryview(buf)
+            try:
+                while nl != -1:
+                    end = nl - 1 if nl > pos and buf[nl - 1] == 0x0D else nl
+                    yield view[pos:end].tobytes()
+                    pos = nl + 1
+                    nl = buf.find(b"\n", pos)
+            finally:
+                view.release()
+            if pos:
+                del buf[:pos]
+        if buf:
+            if buf[-1] == 0x0D:
+                del buf[-1]
+            yield bytes(buf)
+    finally:
+        if len(buf) <= _SSE_SCRATCH_MAX:
+            buf.clear()
+            _SSE_SCRATCH.buf = buf
+
+
+def extract_usage(evt: Dict[str, Any]) -> Dict[str, int] | None:
+    """Chat-style usage from a terminal Responses event, or None if it carries none."""
+    try:
+        usage = (evt.get("response") or {}).get("usage")
+        if not isinstance(usage, dict):
+            return None
+        pt = int(usage.get("input_tokens") or 0)
+        ct = int(usage.get("output_tokens") or 0)
+        tt = int(usage.get("total_tokens") or (pt + ct))
+        return {"prompt_tokens": pt, "completion_tokens": ct, "total_tokens": tt}
+    except Exception:
+        return None
+
+
+def _sse_event(obj: Any) -> bytes:
+    return b"data: " + dumps(obj) + b"\n\n"
+
+
 def sse_translate_chat(
     upstream,
     model: str,
@@ -420,20 +585,9 @@ def sse_translate_chat(
         else:
             return "{}"
     
-    def _extract_usage(evt: Dict[str, Any]) -> Dict[str, int] | None:
-        try:
-            usage = (evt.get("response") or {}).get("usage")
-            if not isinstance(usage, dict):
-                return None
-            pt = int(usage.get("input_tokens") or 0)
-            ct = int(usage.get("output_tokens") or 0)
-            tt = int(usage.get("total_tokens") or (pt + ct))
-            return {"prompt_tokens": pt, "completion_tokens": ct, "total_tokens": tt}
-        except Exception:
-            return None
     try:
         try:
-            line_iterator = upstream.iter_lines(decode_unicode=False)
+            line_iterator = iter_sse_lines(upstream)
         except requests.exceptions.ChunkedEncodingError as e:
             if verbose and vlog:
                 vlog(f"Failed to start stream: {e}")
@@ -444,22 +598,17 @@ def sse_translate_chat(
             try:
                 if not raw:
                     continue
-                line = (
-                    raw.decode("utf-8", errors="ignore")
-                    if isinstance(raw, (bytes, bytearray))
-                    else raw
-                )
                 if verbose and vlog:
-                    vlog(line)
-                if not line.startswith("data: "):
+                    vlog(raw.decode("utf-8", errors="ignore"))
+                if not raw.startswith(b"data: "):
                     continue
-                data = line[len("data: ") :].strip()
+                data = raw[6:].strip()
                 if not data:
                     continue
-                if data == "[DONE]":
+                if data == b"[DONE]":
                     break
                 try:
-                    evt = json.loads(data)
+                    evt = loads(data)
                 except (json.JSONDecodeError, UnicodeDecodeError):
                     continue
             except (
@@ -473,8 +622,11 @@ def sse_translate_chat(
                 yield b"data: [DONE]\n\n"
                 return
             kind = evt.get("type")
-            if isinstance(evt.get("response"), dict) and isinstance(evt["response"].get("id"), str):
-                response_id = evt["response"].get("id") or response_id
+            resp = evt.get("response")
+            if isinstance(resp, dict):
+                rid = resp.get("id")
+                if isinstance(rid, str) and rid:
+                    response_id = rid
 
             if isinstance(kind, str) and ("web_search_call" in kind):
                 try:
@@ -484,7 +636,9 @@ def sse_translate_chat(
                             vlog(f"CM_TOOLS {kind} id={call_id} -> tool_calls(web_search)")
                         except Exception:
                             pass
-                    item = evt.get('item') if isinstance(evt.get('item'), dict) else {}
+                    item = evt.get('item')
+                    if not isinstance(item, dict):
+                        item = {}
                     params_dict = ws_state.setdefault(call_id, {}) if isinstance(ws_state.get(call_id), dict) else {}
                     def _merge_from(src):
                         if not isinstance(src, dict):
@@ -536,7 +690,7 @@ def sse_translate_chat(
                             }
                         ],
                     }
-                    yield f"data: {json.dumps(delta_chunk)}\n\n".encode("utf-8")
+                    yield _sse_event(delta_chunk)
                     if kind.endswith(".completed") or kind.endswith(".done"):
                         finish_chunk = {
                             "id": response_id,
@@ -547,7 +701,7 @@ def sse_translate_chat(
                                 {"index": 0, "delta": {}, "finish_reason": "tool_calls"}
                             ],
                         }
-                        yield f"data: {json.dumps(finish_chunk)}\n\n".encode("utf-8")
+                        yield _sse_event(finish_chunk)
                 except Exception:
                     pass
 
@@ -561,7 +715,7 @@ def sse_translate_chat(
                         "model": model,
                         "choices": [{"index": 0, "delta": {"content": "</think>"}, "finish_reason": None}],
                     }
-                    yield f"data: {json.dumps(close_chunk)}\n\n".encode("utf-8")
+                    yield _sse_event(close_chunk)
                     think_open = False
                     think_closed = True
                 saw_output = True
@@ -572,7 +726,7 @@ def sse_translate_chat(
                     "model": model,
                     "choices": [{"index": 0, "delta": {"content": delta}, "finish_reason": None}],
                 }
-                yield f"data: {json.dumps(chunk)}\n\n".encode("utf-8")
+                yield _sse_event(chunk)
             elif kind == "response.output_item.done":
                 item = evt.get("item") or {}
                 if isinstance(item, dict) and (item.get("type") == "function_call" or item.get("type") == "web_search_call"):
@@ -621,7 +775,7 @@ def sse_translate_chat(
                                 }
                             ],
                         }
-                        yield f"data: {json.dumps(delta_chunk)}\n\n".encode("utf-8")
+                        yield _sse_event(delta_chunk)
 
                         finish_chunk = {
                             "id": response_id,
@@ -630,7 +784,7 @@ def sse_translate_chat(
                             "model": model,
                             "choices": [{"index": 0, "delta": {}, "finish_reason": "tool_calls"}],
                         }
-                        yield f"data: {json.dumps(finish_chunk)}\n\n".encode("utf-8")
+                        yield _sse_event(finish_chunk)
             elif kind == "response.reasoning_summary_part.added":
                 if compat in ("think-tags", "o3"):
                     if saw_any_summary:
@@ -654,7 +808,7 @@ def sse_translate_chat(
                                 }
                             ],
                         }
-                        yield f"data: {json.dumps(nl_chunk)}\n\n".encode("utf-8")
+                        yield _sse_event(nl_chunk)
                         pending_summary_paragraph = False
                     chunk = {
                         "id": response_id,
@@ -669,7 +823,7 @@ def sse_translate_chat(
                             }
                         ],
                     }
-                    yield f"data: {json.dumps(chunk)}\n\n".encode("utf-8")
+                    yield _sse_event(chunk)
                 elif compat == "think-tags":
                     if not think_open and not think_closed:
                         open_chunk = {
@@ -679,7 +833,7 @@ def sse_translate_chat(
                             "model": model,
                             "choices": [{"index": 0, "delta": {"content": "<think>"}, "finish_reason": None}],
                         }
-                        yield f"data: {json.dumps(open_chunk)}\n\n".encode("utf-8")
+                        yield _sse_event(open_chunk)
                         think_open = True
                     if think_open and not think_closed:
                         if kind == "response.reasoning_summary_text.delta" and pending_summary_paragraph:
@@ -690,7 +844,7 @@ def sse_translate_chat(
                                 "model": model,
                                 "choices": [{"index": 0, "delta": {"content": "\n"}, "finish_reason": None}],
                             }
-                            yield f"data: {json.dumps(nl_chunk)}\n\n".encode("utf-8")
+                            yield _sse_event(nl_chunk)
                             pending_summary_paragraph = False
                         content_chunk = {
                             "id": response_id,
@@ -699,7 +853,7 @@ def sse_translate_chat(
                             "model": model,
                             "choices": [{"index": 0, "delta": {"content": delta_txt}, "finish_reason": None}],
                         }
-                        yield f"data: {json.dumps(content_chunk)}\n\n".encode("utf-8")
+                        yield _sse_event(content_chunk)
                 else:
                     if kind == "response.reasoning_summary_text.delta":
                         chunk = {
@@ -715,7 +869,7 @@ def sse_translate_chat(
                                 }
                             ],
                         }
-                        yield f"data: {json.dumps(chunk)}\n\n".encode("utf-8")
+                        yield _sse_event(chunk)
                     else:
                         chunk = {
                             "id": response_id,
@@ -726,7 +880,7 @@ def sse_translate_chat(
                                 {"index": 0, "delta": {"reasoning": delta_txt}, "finish_reason": None}
                             ],
                         }
-                        yield f"data: {json.dumps(chunk)}\n\n".encode("utf-8")
+                        yield _sse_event(chunk)
             elif isinstance(kind, str) and kind.endswith(".done"):
                 pass
             elif kind == "response.output_text.done":
@@ -737,13 +891,13 @@ def sse_translate_chat(
                     "model": model,
                     "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}],
                 }
-                yield f"data: {json.dumps(chunk)}\n\n".encode("utf-8")
+                yield _sse_event(chunk)
             elif kind == "response.failed":
                 err = evt.get("response", {}).get("error", {}).get("message", "response.failed")
                 chunk = {"error": {"message": err}}
-                yield f"data: {json.dumps(chunk)}\n\n".encode("utf-8")
+                yield _sse_event(chunk)
             elif kind == "response.completed":
-                m = _extract_usage(evt)
+                m = extract_usage(evt)
                 if m:
                     upstream_usage = m
                 if compat == "think-tags" and think_open and not think_closed:
@@ -754,7 +908,7 @@ def sse_translate_chat(
                         "model": model,
                         "choices": [{"index": 0, "delta": {"content": "</think>"}, "finish_reason": None}],
                     }
-                    yield f"data: {json.dumps(close_chunk)}\n\n".encode("utf-8")
+                    yield _sse_event(close_chunk)
                     think_open = False
                     think_closed = True
                 if include_usage and upstream_usage:
@@ -767,7 +921,7 @@ def sse_translate_chat(
                             "choices": [{"index": 0, "delta": {}, "finish_reason": None}],
                             "usage": upstream_usage,
                         }
-                        yield f"data: {json.dumps(usage_chunk)}\n\n".encode("utf-8")
+                        yield _sse_event(usage_chunk)
                     except Exception:
                         pass
                 yield b"data: [DONE]\n\n"
@@ -776,33 +930,24 @@ def sse_translate_chat(
         upstream.close()
 
 
+_TEXT_STREAM_PEEK = re.compile(rb'"response\.(?:output_text\.|completed"|created")')
+
+
 def sse_translate_text(upstream, model: str, created: int, verbose: bool = False, vlog=None, *, include_usage: bool = False):
     response_id = "cmpl-stream"
     upstream_usage = None
     
-    def _extract_usage(evt: Dict[str, Any]) -> Dict[str, int] | None:
-        try:
-            usage = (evt.get("response") or {}).get("usage")
-            if not isinstance(usage, dict):
-                return None
-            pt = int(usage.get("input_tokens") or 0)
-            ct = int(usage.get("output_tokens") or 0)
-            tt = int(usage.get("total_tokens") or (pt + ct))
-            return {"prompt_tokens": pt, "completion_tokens": ct, "total_tokens": tt}
-        except Exception:
-            return None
     try:
-        for raw_line in upstream.iter_lines(decode_unicode=False):
+        for raw_line in iter_sse_lines(upstream):
             if not raw_line:
                 continue
-            line = raw_line.decode("utf-8", errors="ignore") if isinstance(raw_line, (bytes, bytearray)) else raw_line
             if verbose and vlog:
-                vlog(line)
-            if not line.startswith("data: "):
+                vlog(raw_line.decode("utf-8", errors="ignore"))
+            if not raw_line.startswith(b"data: "):
                 continue
-            data = line[len("data: "):].strip()
-            if not data or data == "[DONE]":
-                if data == "[DONE]":
+            data = raw_line[6:].strip()
+            if not data or data == b"[DONE]":
+                if data == b"[DONE]":
                     chunk = {
                         "id": response_id,
                         "object": "text_completion.chunk",
@@ -810,15 +955,21 @@ def sse_translate_text(upstream, model: str, created: int, verbose: bool = False
                         "model": model,
                         "choices": [{"index": 0, "text": "", "finish_reason": "stop"}],
                     }
-                    yield f"data: {json.dumps(chunk)}\n\n".encode("utf-8")
+                    yield _sse_event(chunk)
+                continue
+            # Only text, completion and creation events matter here; skip decoding the rest
+            if _TEXT_STREAM_PEEK.search(data) is None:
                 continue
             try:
-                evt = json.loads(data)
+                evt = loads(data)
             except Exception:
                 continue
             kind = evt.get("type")
-            if isinstance(evt.get("response"), dict) and isinstance(evt["response"].get("id"), str):
-                response_id = evt["response"].get("id") or response_id
+            resp = evt.get("response")
+            if isinstance(resp, dict):
+                rid = resp.get("id")
+                if isinstance(rid, str) and rid:
+                    response_id = rid
             if kind == "response.output_text.delta":
                 delta_text = evt.get("delta") or ""
                 chunk = {
@@ -828,7 +979,7 @@ def sse_translate_text(upstream, model: str, created: int, verbose: bool = False
                     "model": model,
                     "choices": [{"index": 0, "text": delta_text, "finish_reason": None}],
                 }
-                yield f"data: {json.dumps(chunk)}\n\n".encode("utf-8")
+                yield _sse_event(chunk)
             elif kind == "response.output_text.done":
                 chunk = {
                     "id": response_id,
@@ -837,9 +988,9 @@ def sse_translate_text(upstream, model: str, created: int, verbose: bool = False
                     "model": model,
                     "choices": [{"index": 0, "text": "", "finish_reason": "stop"}],
                 }
-                yield f"data: {json.dumps(chunk)}\n\n".encode("utf-8")
+                yield _sse_event(chunk)
             elif kind == "response.completed":
-                m = _extract_usage(evt)
+                m = extract_usage(evt)
                 if m:
                     upstream_usage = m
                 if include_usage and upstream_usage:
@@ -852,7 +1003,7 @@ def sse_translate_text(upstream, model: str, created: int, verbose: bool = False
                             "choices": [{"index": 0, "text": "", "finish_reason": None}],
                             "usage": upstream_usage,
                         }
-                        yield f"data: {json.dumps(usage_chunk)}\n\n".encode("utf-8")
+                        yield _sse_event(usage_chunk)
                     except Exception:
                         pass
                 yield b"data: [DONE]\n\n"